@@ -0,0 +1,73 @@
+"""
+Measure the time per decoding step of beam search against greedy decoding, with the text
+decoder of a randomly initialized model and the `PyTorchInference` used by `decode`, so that
+the cost of reordering the key/value cache of the beams is included:
+
+    python benchmarks/bench_beam_search.py --model base --beam_size 5 --steps 100
+"""
+
+import argparse
+import time
+
+import torch
+from bench_kv_cache import DIMENSIONS, random_model
+
+from whisper.decoding import BeamSearchDecoder, GreedyDecoder, PyTorchInference
+
+
+@torch.no_grad()
+def decode(model, audio_features: torch.Tensor, beam_size: int, steps: int) -> float:
+    """Run `steps` decoding steps after a 3-token prompt, returning the seconds they took"""
+    n_vocab = model.dims.n_vocab
+    inference = PyTorchInference(model, initial_token_length=3)
+    if beam_size > 1:
+        # an end-of-text token that is never predicted, so that all the steps are run
+        decoder = BeamSearchDecoder(beam_size, n_vocab, inference)
+    else:
+        decoder = GreedyDecoder(0.0, n_vocab)
+    n_batch = audio_features.shape[0] * beam_size
+    tokens = torch.zeros(n_batch, 3, dtype=torch.long, device=audio_features.device)
+    sum_logprobs = torch.zeros(n_batch, device=audio_features.device)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        logits = inference.logits(tokens, audio_features)[:, -1]
+        tokens, _ = decoder.update(tokens, logits, sum_logprobs)
+    if audio_features.is_cuda:
+        torch.cuda.synchronize()
+    elapsed = time.perf_counter() - start
+
+    inference.cleanup_caching()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", choices=DIMENSIONS, default="base")
+    parser.add_argument("--beam_size", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=100, help="tokens to decode")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+    assert args.steps + 3 <= 448, "the text context is 448 tokens"
+
+    model = random_model(args.model, args.device)
+    audio_features = torch.randn(1, 1500, model.dims.n_audio_state, device=args.device)
+    decode(model, audio_features, args.beam_size, 5)  # warm up
+
+    times = {}
+    for beam_size in [1, args.beam_size]:
+        name = "greedy" if beam_size == 1 else f"beam {beam_size}"
+        times[name] = min(
+            decode(model, audio_features, beam_size, args.steps)
+            for _ in range(args.repeat)
+        )
+        print(f"{name:>8}: {times[name] / args.steps * 1000:.2f} ms per step")
+    ratio = times[f"beam {args.beam_size}"] / times["greedy"]
+    print(f"beam search costs {ratio:.2f}x greedy decoding")
+
+
+if __name__ == "__main__":
+    main()
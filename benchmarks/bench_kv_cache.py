@@ -0,0 +1,104 @@
+"""
+Measure the time per decoding step of the text decoder of a randomly initialized model, with
+the preallocated `KVCache` and with the key/value cache of `Whisper.install_kv_cache_hooks`,
+whose tensors are concatenated with the new keys and values at every step:
+
+    python benchmarks/bench_kv_cache.py --model base --batch_size 5 --steps 200
+"""
+
+import argparse
+import time
+
+import torch
+
+from whisper.model import KVCache, ModelDimensions, Whisper
+
+DIMENSIONS = {
+    "tiny": dict(n_audio_state=384, n_audio_head=6, n_audio_layer=4),
+    "base": dict(n_audio_state=512, n_audio_head=8, n_audio_layer=6),
+    "small": dict(n_audio_state=768, n_audio_head=12, n_audio_layer=12),
+    "medium": dict(n_audio_state=1024, n_audio_head=16, n_audio_layer=24),
+}
+
+
+def random_model(name: str, device: str) -> Whisper:
+    audio = DIMENSIONS[name]
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_vocab=51865,
+        n_text_ctx=448,
+        n_text_state=audio["n_audio_state"],
+        n_text_head=audio["n_audio_head"],
+        n_text_layer=audio["n_audio_layer"],
+        **audio,
+    )
+    model = Whisper(dims).to(device)
+    torch.nn.init.normal_(model.decoder.positional_embedding)  # not initialized
+    return model.eval()
+
+
+@torch.no_grad()
+def decode(
+    model: Whisper, audio_features: torch.Tensor, steps: int, cache: str
+) -> float:
+    """Run `steps` forward passes of one token after a 3-token prompt, returning the seconds"""
+    n_batch = audio_features.shape[0]
+    tokens = torch.zeros(n_batch, 3, dtype=torch.long, device=audio_features.device)
+    if cache == "hooks":
+        kv_cache, hooks = model.install_kv_cache_hooks()
+    else:
+        kv_cache, hooks = (
+            KVCache(
+                model.decoder, n_batch, audio_features.dtype, audio_features.device
+            ),
+            [],
+        )
+
+    start = time.perf_counter()
+    logits = model.decoder(tokens, audio_features, kv_cache=kv_cache)
+    for _ in range(steps):
+        next_tokens = logits[:, -1].argmax(dim=-1, keepdim=True)
+        logits = model.decoder(next_tokens, audio_features, kv_cache=kv_cache)
+    if audio_features.is_cuda:
+        torch.cuda.synchronize()
+    elapsed = time.perf_counter() - start
+
+    for hook in hooks:
+        hook.remove()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", choices=DIMENSIONS, default="base")
+    parser.add_argument("--batch_size", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=200, help="tokens to decode")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fuse_qkv", action="store_true", help="see Whisper.fuse_qkv")
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+    assert args.steps + 3 <= 448, "the text context is 448 tokens"
+
+    model = random_model(args.model, args.device)
+    if args.fuse_qkv:
+        model.fuse_qkv()
+    audio_features = torch.randn(
+        args.batch_size, 1500, model.dims.n_audio_state, device=args.device
+    )
+    decode(model, audio_features, 5, "hooks")  # warm up
+
+    for cache in ["hooks", "kv_cache"]:
+        times = [
+            decode(model, audio_features, args.steps, cache) for _ in range(args.repeat)
+        ]
+        print(
+            f"{cache:>8}: {min(times) / args.steps * 1000:.2f} ms per step "
+            f"(best of {args.repeat}, {args.steps} steps, batch of {args.batch_size})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the speed and the accuracy of CPU inference with the float32 model and with the model
+quantized dynamically to int8, by transcribing audio files with both and measuring the time
+taken and the word error rate (WER) against reference transcripts, and of one against the other:
+
+    python benchmarks/bench_quantize.py --model base tests/jfk.flac
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+import whisper
+from whisper.normalizers import EnglishTextNormalizer
+
+# the reference transcripts of the audio files in tests/
+REFERENCES = {
+    "jfk.flac": (
+        "And so my fellow Americans, ask not what your country can do for you, "
+        "ask what you can do for your country."
+    ),
+}
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """The word-level edit distance between the transcripts, over the words of the reference"""
+    normalizer = EnglishTextNormalizer()
+    reference, hypothesis = (
+        normalizer(reference).split(),
+        normalizer(hypothesis).split(),
+    )
+    distances = list(range(len(hypothesis) + 1))
+    for i, reference_word in enumerate(reference, 1):
+        previous, distances[0] = distances[0], i
+        for j, hypothesis_word in enumerate(hypothesis, 1):
+            substitution = previous + (reference_word != hypothesis_word)
+            previous = distances[j]
+            distances[j] = min(distances[j] + 1, distances[j - 1] + 1, substitution)
+    return distances[-1] / max(len(reference), 1)
+
+
+def transcribe(model, audio: str, repeat: int):
+    """Transcribe the audio `repeat` times, returning the text and the shortest time taken"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = model.transcribe(audio, language="en", temperature=0.0, fp16=False)
+        times.append(time.perf_counter() - start)
+    return result["text"], min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("audio", nargs="+", help="audio files to transcribe")
+    parser.add_argument("--model", default="base", help="name or path of the model")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads")
+    args = parser.parse_args()
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    models = {
+        "float32": whisper.load_model(args.model, device="cpu"),
+        "int8": whisper.load_model(args.model, device="cpu", quantize="int8"),
+    }
+    totals = {name: 0.0 for name in models}
+    for audio in args.audio:
+        reference = REFERENCES.get(os.path.basename(audio))
+        texts = {}
+        for name, model in models.items():
+            transcribe(model, audio, 1)  # warm up
+            texts[name], elapsed = transcribe(model, audio, args.repeat)
+            totals[name] += elapsed
+            wer = (
+                ""
+                if reference is None
+                else f", WER {word_error_rate(reference, texts[name]):.1%}"
+            )
+            print(f"{audio} [{name:>7}] {elapsed:.2f} s{wer}: {texts[name].strip()}")
+        agreement = word_error_rate(texts["float32"], texts["int8"])
+        print(f"{audio}: WER of int8 against float32 {agreement:.1%}")
+
+    speedup = totals["float32"] / totals["int8"]
+    print(f"int8 is {speedup:.2f}x as fast as float32 in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure the start-up costs paid by each new process: importing whisper, importing the
+transcription stack with PyTorch, and the first word-level alignment, whose numba kernels
+are compiled on the first run and loaded from numba's on-disk cache afterwards:
+
+    python benchmarks/bench_startup.py
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+STAGES = {
+    "import whisper": "import whisper",
+    "import whisper.transcribe": "import whisper.transcribe",
+    "first dtw (numba)": (
+        "import torch\n"
+        "from whisper.timing import dtw\n"
+        "x = torch.randn(50, 300)\n"
+        "start = time.perf_counter()\n"
+        "dtw(x)"
+    ),
+}
+
+TIMED = """
+import json, time
+start = time.perf_counter()
+{code}
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def time_stage(code: str, env: dict) -> float:
+    script = TIMED.format(code=code)
+    output = subprocess.check_output([sys.executable, "-c", script], env=env)
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="processes per stage")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+        cold = time_stage(STAGES["first dtw (numba)"], env)
+        print(f"{'first dtw (numba), cold cache':>32}: {cold * 1000:.1f} ms")
+        for stage, code in STAGES.items():
+            times = [time_stage(code, env) for _ in range(args.repeat)]
+            print(
+                f"{stage:>32}: median {statistics.median(times) * 1000:.1f} ms, "
+                f"min {min(times) * 1000:.1f} ms over {args.repeat} processes"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Measure the time to the first use of `whisper.tokenizer.get_tokenizer()` in a new process,
+with the compiled `.tokenizer` assets and with the `.tiktoken` files they are compiled from:
+
+    python benchmarks/bench_tokenizer.py
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+FIRST_USE = """
+import json, sys, time
+import whisper.tokenizer as tokenizer
+if sys.argv[1] == "tiktoken":
+    tokenizer.load_compiled_encoding = lambda name: None
+start = time.perf_counter()
+t = tokenizer.get_tokenizer(multilingual=True, language="en", task="transcribe")
+t.non_speech_tokens
+t.encode(" Hello world")
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def time_first_use(source: str) -> float:
+    output = subprocess.check_output([sys.executable, "-c", FIRST_USE, source])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="processes per source")
+    args = parser.parse_args()
+
+    for source in ["tiktoken", "compiled"]:
+        times = [time_first_use(source) for _ in range(args.repeat)]
+        print(
+            f"{source:>8}: median {statistics.median(times) * 1000:.1f} ms, "
+            f"min {min(times) * 1000:.1f} ms over {args.repeat} processes"
+        )
+
+
+if __name__ == "__main__":
+    main()
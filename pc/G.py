@@ -57,7 +57,7 @@ def download_and_transcribe(video_url: str, output_path: str = "C:\\files\\MEGA\
 
 def transcribe_audio(file_path: str, output_folder: str):
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = whisper.load_model("base", device=device)
+    model = whisper.get_model("base", device=device)
 
     text_filename = os.path.splitext(os.path.basename(file_path))[0] + ".txt"
     text_path = os.path.join(output_folder, text_filename)
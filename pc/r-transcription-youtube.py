@@ -153,7 +153,7 @@ def download_and_transcribe(video_url: str, output_path: str, whisper_model_name
 def transcribe_audio(file_path: str, output_folder: str, whisper_model_name: str):
     """Транскрибирует аудиофайл с использованием Whisper."""
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = whisper.load_model(whisper_model_name, device=device)
+    model = whisper.get_model(whisper_model_name, device=device)
 
     text_filename = os.path.splitext(os.path.basename(file_path))[0] + ".txt"
     text_path = os.path.join(output_folder, text_filename)
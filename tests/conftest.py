@@ -1,7 +1,11 @@
 import random as rand
+from dataclasses import asdict
 
 import numpy
 import pytest
+import torch
+
+from whisper.model import ModelDimensions, Whisper
 
 
 def pytest_configure(config):
@@ -12,3 +16,30 @@ def pytest_configure(config):
 def random():
     rand.seed(42)
     numpy.random.seed(42)
+
+
+@pytest.fixture
+def random_model():
+    """Make a tiny Whisper model with random weights, with 10 audio frames and 16 dimensions"""
+
+    def make(n_vocab: int = 100, n_text_ctx: int = 12) -> Whisper:
+        dims = ModelDimensions(80, 10, 16, 2, 2, n_vocab, n_text_ctx, 16, 2, 2)
+        model = Whisper(dims).eval()
+        torch.nn.init.normal_(model.decoder.positional_embedding)  # not initialized
+        return model
+
+    return make
+
+
+@pytest.fixture
+def model_checkpoint(tmp_path, random_model):
+    """Save a model, by default a new `random_model()`, as a checkpoint and return its path"""
+
+    def save(name: str = "model", model: Whisper = None) -> str:
+        model = model or random_model()
+        checkpoint = dict(dims=asdict(model.dims), model_state_dict=model.state_dict())
+        path = str(tmp_path / f"{name}.pt")
+        torch.save(checkpoint, path)
+        return path
+
+    return save
@@ -1,8 +1,29 @@
+import io
 import os.path
+import pathlib
+import subprocess
+import wave
 
 import numpy as np
+import pytest
+import torch
 
-from whisper.audio import SAMPLE_RATE, load_audio, log_mel_spectrogram
+import whisper.audio
+from whisper.audio import (
+    HOP_LENGTH,
+    MEL_BLOCK_FRAMES,
+    N_FFT,
+    N_SAMPLES,
+    SAMPLE_RATE,
+    LazyLogMelSpectrogram,
+    Resampler,
+    load_audio,
+    log_mel_spectrogram,
+    mel_filters,
+    resample,
+    stream_audio,
+)
+from whisper.cache import DiskCache
 
 
 def test_audio():
@@ -17,3 +38,275 @@ def test_audio():
 
     assert np.allclose(mel_from_audio, mel_from_file)
     assert mel_from_audio.max() - mel_from_audio.min() <= 2.0
+
+
+def test_stream_audio():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+
+    chunks = list(stream_audio(audio_path, chunk_seconds=1.5))
+    assert all(len(chunk) == SAMPLE_RATE * 1.5 for chunk in chunks[:-1])
+    assert np.array_equal(np.concatenate(chunks), audio)
+
+    for padding in [0, N_SAMPLES]:
+        mel_from_audio = log_mel_spectrogram(audio, padding=padding)
+        mel_from_stream = log_mel_spectrogram(
+            stream_audio(audio_path, chunk_seconds=1.5), padding=padding
+        )
+        assert mel_from_audio.shape == mel_from_stream.shape
+        assert np.allclose(mel_from_audio, mel_from_stream)
+
+
+def test_lazy_log_mel_spectrogram():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+    mel = log_mel_spectrogram(audio, padding=N_SAMPLES)
+
+    for source in [
+        audio_path,
+        audio,
+        stream_audio(audio_path, chunk_seconds=1.5),
+        (stream_audio(audio_path, chunk_seconds=1.5), SAMPLE_RATE),
+    ]:
+        lazy_mel = LazyLogMelSpectrogram(source, padding=N_SAMPLES)
+        assert lazy_mel.shape == mel.shape
+        for start in [0, 1, 1000, 1099, 3000]:
+            assert np.allclose(
+                lazy_mel[:, start : start + 3000], mel[:, start : start + 3000]
+            )
+
+
+def test_log_mel_spectrogram_blocks():
+    audio = torch.randn(MEL_BLOCK_FRAMES * HOP_LENGTH * 2 + 12345) * 0.1
+
+    window = torch.hann_window(N_FFT)
+    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    mel_spec = mel_filters(audio.device, 80) @ stft[..., :-1].abs() ** 2
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+    expected = (log_spec + 4.0) / 4.0
+
+    for num_workers in [1, 4]:
+        mel = log_mel_spectrogram(audio, num_workers=num_workers)
+        assert mel.shape == expected.shape
+        assert np.allclose(mel, expected)
+
+
+def test_int16_audio():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+    audio_int16 = load_audio(audio_path, dtype=np.int16)
+    assert audio_int16.dtype == np.int16
+    assert np.array_equal(audio_int16 / 32768.0, audio)
+
+    mel = log_mel_spectrogram(audio, padding=N_SAMPLES)
+    assert np.allclose(log_mel_spectrogram(audio_int16, padding=N_SAMPLES), mel)
+
+    lazy_mel = LazyLogMelSpectrogram(audio_int16, padding=N_SAMPLES)
+    assert np.allclose(lazy_mel[:, 500:3500], mel[:, 500:3500])
+
+
+def test_audio_clips(tmp_path):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+
+    # the file is resampled, so the samples around the seek point differ slightly
+    clip = load_audio(audio_path, start=2.5, duration=4.0)
+    expected = audio[int(2.5 * SAMPLE_RATE) : int(6.5 * SAMPLE_RATE)]
+    assert clip.shape == expected.shape
+    assert np.allclose(clip, expected, atol=1e-3)
+
+    # decoding a lossy file from a seek point gives the same samples after the pre-roll
+    mp3_path = str(tmp_path / "jfk.mp3")
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", audio_path, mp3_path], check=True
+    )
+    clips = [(500, 700), (200, 300)]
+    for path in [audio_path, mp3_path]:
+        lazy_mel = LazyLogMelSpectrogram(path, padding=N_SAMPLES, clips=clips)
+        expected = LazyLogMelSpectrogram(
+            load_audio(path), padding=N_SAMPLES, clips=clips
+        )
+        assert np.isclose(lazy_mel.log_spec_max, expected.log_spec_max, atol=1e-5)
+        for start, end in clips:
+            assert np.allclose(
+                lazy_mel[:, start:end], expected[:, start:end], atol=1e-4
+            )
+
+
+def test_load_audio_parallel(monkeypatch):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path, dtype=np.int16)
+
+    monkeypatch.setattr(whisper.audio, "MIN_DECODE_SEGMENT", 2)
+    assert np.array_equal(load_audio(audio_path, dtype=np.int16, num_workers=4), audio)
+
+    clip = load_audio(audio_path, start=1.0, duration=8.0, num_workers=3)
+    expected = load_audio(audio_path, start=1.0, duration=8.0)
+    assert clip.shape == expected.shape
+    assert np.allclose(clip, expected, atol=1e-2)
+
+
+def test_log_mel_spectrogram_decodes_serially(monkeypatch):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    expected = log_mel_spectrogram(load_audio(audio_path))
+
+    def probe_duration(file):
+        raise AssertionError("the duration should only be probed for parallel decoding")
+
+    monkeypatch.setattr(whisper.audio, "MIN_DECODE_SEGMENT", 2)
+    monkeypatch.setattr(whisper.audio, "_probe_duration", probe_duration)
+    monkeypatch.setattr(torch, "get_num_threads", lambda: 4)
+    assert torch.equal(log_mel_spectrogram(audio_path), expected)
+
+
+def test_load_wav(tmp_path):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path, dtype=np.int16)
+
+    for channels in [1, 2]:
+        wav_path = str(tmp_path / f"jfk_{channels}.wav")
+        with wave.open(wav_path, "wb") as f:
+            f.setnchannels(channels)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(np.repeat(audio, channels).tobytes())
+
+        wav_audio = load_audio(wav_path, dtype=np.int16)
+        # mono files are memory-mapped, others are down-mixed by ffmpeg
+        assert isinstance(wav_audio, np.memmap) == (channels == 1)
+        assert np.array_equal(wav_audio, audio)
+        assert np.array_equal(
+            load_audio(wav_path, start=1.5, duration=2.0),
+            audio[24000:56000] / np.float32(32768.0),
+        )
+
+
+def test_load_audio_from_memory():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+    with open(audio_path, "rb") as f:
+        data = f.read()
+
+    for source in [data, memoryview(data), io.BytesIO(data)]:
+        assert np.array_equal(load_audio(source), audio)
+
+    chunks = list(stream_audio(io.BytesIO(data), chunk_seconds=1.5))
+    assert np.array_equal(np.concatenate(chunks), audio)
+    assert np.allclose(log_mel_spectrogram(data), log_mel_spectrogram(audio))
+
+
+def test_load_audio_from_path(tmp_path):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path, dtype=np.int16)
+
+    wav_path = tmp_path / "jfk.wav"
+    with wave.open(str(wav_path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(audio.tobytes())
+
+    for path in [pathlib.Path(audio_path), wav_path]:
+        assert np.array_equal(load_audio(path, dtype=np.int16), audio)
+        chunks = list(stream_audio(path, dtype=np.int16))
+        assert np.array_equal(np.concatenate(chunks), audio)
+
+    mel = log_mel_spectrogram(audio)
+    assert torch.equal(log_mel_spectrogram(wav_path), mel)
+    lazy_mel = LazyLogMelSpectrogram(wav_path)
+    assert lazy_mel.file == str(wav_path)
+    assert torch.allclose(lazy_mel[:, : mel.shape[-1]], mel, atol=1e-4)
+
+
+class FailingReader(io.BytesIO):
+    """Reads a few KB at a time, and fails after `fail_after` bytes, like a dropped upload"""
+
+    def __init__(self, data: bytes, fail_after: int):
+        super().__init__(data)
+        self.fail_after = fail_after
+
+    def read(self, size: int = -1) -> bytes:
+        if self.tell() >= self.fail_after:
+            raise OSError("connection reset")
+        return super().read(4096)
+
+
+def test_load_audio_from_failing_reader():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    with open(audio_path, "rb") as f:
+        data = f.read()
+
+    # ffmpeg would decode the part read before the error without failing
+    with pytest.raises(OSError, match="connection reset"):
+        load_audio(FailingReader(data, len(data) // 2))
+    with pytest.raises(OSError, match="connection reset"):
+        list(stream_audio(FailingReader(data, len(data) // 2), chunk_seconds=1.5))
+
+
+def test_resample():
+    for sample_rate in [8000, 44100, 48000]:
+        t = np.arange(sample_rate * 2) / sample_rate
+        audio = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+
+        resampled = resample(audio, sample_rate)
+        assert resampled.shape == (SAMPLE_RATE * 2,)
+        t = np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+        assert np.allclose(
+            resampled[100:-100], np.sin(2 * np.pi * 440 * t[100:-100]), atol=1e-3
+        )
+
+        resampler = Resampler(sample_rate)
+        blocks = [resampler(block) for block in np.array_split(audio, 7)]
+        blocks.append(resampler.flush())
+        assert np.allclose(np.concatenate(blocks), resampled, atol=1e-6)
+
+        mel = log_mel_spectrogram((audio, sample_rate))
+        assert np.allclose(mel, log_mel_spectrogram(resampled))
+        chunks = np.array_split(audio, 5)
+        assert np.allclose(log_mel_spectrogram((chunks, sample_rate)), mel, atol=1e-5)
+
+
+def test_load_audio_channels():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path, dtype=np.int16)
+
+    stereo = load_audio(audio_path, dtype=np.int16, channels=2)
+    assert stereo.shape == (2, len(audio))
+    assert np.abs(stereo.mean(axis=0) - audio).max() <= 1
+
+
+def test_pcm_cache(tmp_path, monkeypatch):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+
+    whisper.audio.set_pcm_cache(DiskCache(str(tmp_path)))
+    try:
+        assert np.array_equal(load_audio(audio_path), audio)
+        assert len(os.listdir(tmp_path)) == 1
+
+        # cached samples are read without running ffmpeg
+        monkeypatch.setattr(whisper.audio, "_decode_audio", None)
+        assert np.array_equal(load_audio(audio_path), audio)
+        pcm = load_audio(audio_path, dtype=np.int16, start=1.0, duration=2.0)
+        assert np.array_equal(pcm / 32768.0, audio[SAMPLE_RATE : 3 * SAMPLE_RATE])
+    finally:
+        whisper.audio.set_pcm_cache(None)
+
+
+def test_mel_cache(tmp_path, monkeypatch):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+    mel = log_mel_spectrogram(audio_path, padding=N_SAMPLES)
+
+    whisper.audio.set_mel_cache(DiskCache(str(tmp_path)))
+    try:
+        for source in [audio_path, audio]:
+            assert torch.equal(log_mel_spectrogram(source, padding=N_SAMPLES), mel)
+        assert len(os.listdir(tmp_path)) == 2
+
+        monkeypatch.setattr(whisper.audio, "_log_mel_spectrogram", None)
+        for source in [audio_path, audio]:
+            assert torch.equal(log_mel_spectrogram(source, padding=N_SAMPLES), mel)
+    finally:
+        whisper.audio.set_mel_cache(None)
@@ -0,0 +1,112 @@
+import hashlib
+import os
+
+import numpy as np
+import torch
+
+import whisper
+from whisper import cache as whisper_cache
+from whisper.cache import DiskCache, EncoderCache, TranscriptCache, verified_file_sha256
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=3000)
+    arrays = {name: np.full(400, i, dtype=np.int16) for i, name in enumerate("abcd")}
+
+    assert cache.get("a") is None
+    for name in "abc":
+        stored = cache.put(name, arrays[name])
+        assert isinstance(stored, np.memmap)
+        assert np.array_equal(stored, arrays[name])
+        os.utime(os.path.join(tmp_path, name + ".npy"), (0, "abc".index(name)))
+
+    # reading "a" makes "b" the least recently used entry, evicted by adding "d"
+    assert np.array_equal(cache.get("a"), arrays["a"])
+    cache.put("d", arrays["d"])
+    assert cache.get("b") is None
+    for name in "acd":
+        assert np.array_equal(cache.get(name), arrays[name])
+
+    assert cache.put("e", np.zeros(2000, dtype=np.int16)) is None
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+
+def test_encoder_cache(tmp_path, monkeypatch, random_model):
+    model = random_model()
+    mel = torch.randn(3, 80, 20)
+    mel[2] = mel[0]
+    with torch.no_grad():
+        expected = model.encoder(mel)
+
+    model.encoder_cache = EncoderCache(disk=DiskCache(str(tmp_path)))
+    calls = []
+    encoder_forward = model.encoder.forward
+    monkeypatch.setattr(
+        model.encoder, "forward", lambda x: calls.append(len(x)) or encoder_forward(x)
+    )
+    with torch.no_grad():
+        assert torch.allclose(model.embed_audio(mel), expected, atol=1e-6)
+        assert torch.allclose(model.embed_audio(mel[1:]), expected[1:], atol=1e-6)
+    assert calls == [2]  # the third window is the same as the first one
+    assert len(os.listdir(tmp_path)) == 2
+
+    # the on-disk entries are found by a new cache
+    model.encoder_cache = EncoderCache(disk=DiskCache(str(tmp_path)))
+    with torch.no_grad():
+        assert torch.allclose(model.embed_audio(mel), expected, atol=1e-6)
+    assert calls == [2]
+
+
+def test_transcript_cache(tmp_path, random_model):
+    model = random_model()
+    audio = np.random.randn(16000).astype(np.float32)
+    options = dict(temperature=(0.0, 0.2), decode_options=dict(language="en"))
+
+    key = TranscriptCache.transcript_key(model, audio, options)
+    assert key == TranscriptCache.transcript_key(model, audio.copy(), dict(options))
+    assert key != TranscriptCache.transcript_key(model, audio[1:], options)
+    assert key != TranscriptCache.transcript_key(
+        model, audio, dict(options, beam_size=5)
+    )
+    assert key != TranscriptCache.transcript_key(random_model(), audio, options)
+    reordered = dict(
+        decode_options=dict(beam_size=5, language="en"), temperature=(0.0, 0.2)
+    )
+    assert TranscriptCache.transcript_key(
+        model, audio, dict(options, decode_options=dict(language="en", beam_size=5))
+    ) == TranscriptCache.transcript_key(model, audio, reordered)
+    assert TranscriptCache.transcript_key(model, iter([audio]), options) is None
+
+    cache = TranscriptCache(str(tmp_path))
+    result = dict(text=" héllo", segments=[dict(id=0, tokens=[1, 2])], language="en")
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert TranscriptCache(str(tmp_path)).get(key) == result
+    assert os.listdir(tmp_path) == [key + ".json"]
+
+
+def test_verified_file_sha256(tmp_path, monkeypatch):
+    path = str(tmp_path / "model.pt")
+    with open(path, "wb") as f:
+        f.write(b"weights")
+    sha256 = hashlib.sha256(b"weights").hexdigest()
+
+    hashed = []
+    file_sha256 = whisper_cache.file_sha256
+    monkeypatch.setattr(
+        whisper_cache, "file_sha256", lambda p: hashed.append(p) or file_sha256(p)
+    )
+    assert verified_file_sha256(path) == sha256
+    assert os.path.exists(path + ".sha256")
+    assert verified_file_sha256(path) == sha256
+    url = f"https://example.com/{sha256}/model.pt"
+    assert whisper._download(url, str(tmp_path), in_memory=False) == path
+    assert whisper._download(url, str(tmp_path), in_memory=True) == b"weights"
+    assert hashed == [path]
+
+    # the file is hashed again once it changes
+    with open(path, "wb") as f:
+        f.write(b"other weights")
+    expected = hashlib.sha256(b"other weights").hexdigest()
+    assert verified_file_sha256(path) == expected
+    assert hashed == [path, path]
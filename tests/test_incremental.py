@@ -0,0 +1,66 @@
+import numpy as np
+
+from whisper.audio import SAMPLE_RATE
+from whisper.incremental import (
+    audio_fingerprints,
+    match_fingerprints,
+    reusable_segments,
+)
+
+
+def test_match_fingerprints():
+    audio = np.random.default_rng(0).integers(-3000, 3000, 60 * SAMPLE_RATE)
+    audio = audio.astype(np.int16)
+    fingerprints = audio_fingerprints(audio)
+    assert sum(length for _, length in fingerprints) == len(audio)
+
+    # cut 2.7 seconds out of the middle, and prepend a second of silence
+    cut_start, cut_end = 20 * SAMPLE_RATE + 123, 22 * SAMPLE_RATE + 11323
+    edited = np.concatenate(
+        [np.zeros(SAMPLE_RATE, np.int16), audio[:cut_start], audio[cut_end:]]
+    )
+    regions = match_fingerprints(fingerprints, audio_fingerprints(edited))
+    assert len(regions) == 2
+    for previous_start, current_start, length in regions:
+        previous = audio[previous_start : previous_start + length]
+        assert np.array_equal(previous, edited[current_start : current_start + length])
+    (start_1, shift_1, length_1), (start_2, shift_2, length_2) = [
+        (a, b - a, n) for a, b, n in regions
+    ]
+    assert shift_1 == SAMPLE_RATE and shift_2 == SAMPLE_RATE - (cut_end - cut_start)
+    assert start_1 + length_1 <= cut_start and start_2 >= cut_end
+    assert length_1 + length_2 > len(audio) - 4 * SAMPLE_RATE
+
+
+def test_fingerprints_of_short_audio():
+    assert audio_fingerprints(np.zeros(0, np.int16)) == []
+    fingerprints = audio_fingerprints(np.arange(3, dtype=np.int16))
+    assert [length for _, length in fingerprints] == [3]
+    assert match_fingerprints([], fingerprints) == []
+
+
+def test_reusable_segments():
+    def segment(seek, start, end):
+        return dict(seek=seek, start=start, end=end, text="", tokens=[seek])
+
+    previous = dict(
+        segments=[
+            segment(seek, seek / 100, seek / 100 + 25) for seek in range(0, 12000, 3000)
+        ],
+        fingerprints=[("", 120 * SAMPLE_RATE)],
+        language="en",
+    )
+    # 5 seconds are cut at 100 seconds, in the last window
+    regions = [
+        (0, 0, 98 * SAMPLE_RATE),
+        (105 * SAMPLE_RATE, 98 * SAMPLE_RATE, 15 * SAMPLE_RATE),
+    ]
+    segments, clips = reusable_segments(previous, regions, 113.0)
+    assert [s["seek"] for s in segments] == [0, 3000]
+    assert clips == [60.0, 113.0]
+
+    # the same audio with a second of silence prepended is reused up to the last window
+    regions = [(0, SAMPLE_RATE, 120 * SAMPLE_RATE)]
+    segments, clips = reusable_segments(previous, regions, 121.0)
+    assert [s["start"] for s in segments] == [1.0, 31.0, 61.0, 91.0]
+    assert clips == [0.0, 1.0]
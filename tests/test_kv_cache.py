@@ -0,0 +1,55 @@
+from contextlib import nullcontext
+
+import pytest
+import torch
+
+from whisper.model import KVCache, disable_sdpa
+
+
+@torch.no_grad()
+def test_kv_cache(random_model):
+    model = random_model()
+    audio_features = torch.randn(1, 10, 16).repeat(3, 1, 1)  # as in beam search
+    tokens = torch.randint(0, 100, (3, 8))
+    expected = model.decoder(tokens, audio_features)
+
+    kv_cache = KVCache(model.decoder, 3, audio_features.dtype, audio_features.device)
+    logits = [model.decoder(tokens[:, :3], audio_features, kv_cache=kv_cache)]
+    for i in range(3, 8):
+        token = tokens[:, i : i + 1]
+        logits.append(model.decoder(token, audio_features, kv_cache=kv_cache))
+
+    hooks_cache, hooks = model.install_kv_cache_hooks()
+    hooks_logits = [model.decoder(tokens[:, :3], audio_features, kv_cache=hooks_cache)]
+    for i in range(3, 8):
+        token = tokens[:, i : i + 1]
+        hooks_logits.append(model.decoder(token, audio_features, kv_cache=hooks_cache))
+    for hook in hooks:
+        hook.remove()
+
+    assert kv_cache.length == 8
+    assert torch.allclose(torch.cat(logits, dim=1), expected, atol=1e-5)
+    assert torch.allclose(torch.cat(hooks_logits, dim=1), expected, atol=1e-5)
+
+    # reordering the rows continues decoding as if the sequences had been decoded in that order
+    kv_cache.reorder([2, 2, 0])
+    tokens = torch.cat([tokens[[2, 2, 0]], torch.randint(0, 100, (3, 1))], dim=1)
+    last = model.decoder(tokens[:, -1:], audio_features, kv_cache=kv_cache)
+    expected = model.decoder(tokens, audio_features)[:, -1:]
+    assert torch.allclose(last, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("use_sdpa", [True, False])
+@torch.no_grad()
+def test_kv_cache_shared_cross_attention(random_model, use_sdpa):
+    model = random_model()
+    audio_features = torch.randn(2, 10, 16)
+    tokens = torch.randint(0, 100, (6, 4))  # 3 rows for each audio
+    expected = model.decoder(tokens, audio_features.repeat_interleave(3, dim=0))
+
+    with disable_sdpa() if not use_sdpa else nullcontext():
+        kv_cache = KVCache(model.decoder, 6, torch.float32, torch.device("cpu"))
+        logits = model.decoder(tokens[:, :3], audio_features, kv_cache=kv_cache)
+        last = model.decoder(tokens[:, 3:], audio_features, kv_cache=kv_cache)
+    assert kv_cache.cross_keys[0].shape == (2, 10, 16)
+    assert torch.allclose(torch.cat([logits, last], dim=1), expected, atol=1e-5)
@@ -0,0 +1,76 @@
+import sys
+from dataclasses import asdict
+
+import pytest
+import torch
+
+import whisper
+from whisper.transcribe import cli
+
+
+@pytest.mark.parametrize(
+    "mmap",
+    [
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not whisper._supports_mmap_loading(),
+                reason="memory-mapped loading requires torch>=2.1",
+            ),
+        ),
+        False,
+    ],
+)
+def test_load_model(monkeypatch, random_model, model_checkpoint, mmap):
+    original = random_model().half()
+    path = model_checkpoint(model=original)
+    if not mmap:
+        monkeypatch.setattr(whisper, "_supports_mmap_loading", lambda: False)
+
+    model = whisper.load_model(path, device="cpu")
+    assert next(model.parameters()).dtype == torch.float32
+    for name, tensor in original.state_dict().items():
+        assert torch.equal(model.state_dict()[name], tensor.float()), name
+    assert torch.equal(model.decoder.mask, original.decoder.mask)
+    assert torch.equal(
+        model.alignment_heads.to_dense(), original.alignment_heads.to_dense()
+    )
+
+    # the float16 weights of the checkpoint are used as they are, computing in float32
+    model_fp16 = whisper.load_model(path, device="cpu", dtype=torch.float16)
+    tensors = [*model_fp16.parameters(), *model_fp16.buffers()]
+    assert not any(tensor.is_meta for tensor in tensors)
+    mel = torch.randn(1, 80, 20)
+    tokens = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        assert torch.equal(model_fp16(mel, tokens), model(mel, tokens))
+
+
+def test_load_model_legacy_format(tmp_path, random_model):
+    original = random_model()
+    checkpoint = dict(
+        dims=asdict(original.dims), model_state_dict=original.state_dict()
+    )
+    path = str(tmp_path / "legacy.pt")
+    torch.save(checkpoint, path, _use_new_zipfile_serialization=False)
+
+    model = whisper.load_model(path, device="cpu")
+    for name, tensor in original.state_dict().items():
+        assert torch.equal(model.state_dict()[name], tensor), name
+
+
+def test_quantize_fused_model(monkeypatch, tmp_path, model_checkpoint):
+    path = model_checkpoint()
+    with pytest.raises(ValueError):
+        whisper.load_model(str(tmp_path / "missing.pt"), fuse_qkv=True, quantize="int8")
+
+    # the command line rejects the combination before loading the model
+    def load_model(*args, **kwargs):
+        raise AssertionError("the model should not be loaded")
+
+    monkeypatch.setattr(whisper, "load_model", load_model)
+    argv = ["whisper", "audio.wav", "--model", path, "--device", "cpu"]
+    argv += ["--output_dir", str(tmp_path), "--quantize", "int8", "--fuse_qkv", "True"]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit):
+        cli()
@@ -0,0 +1,111 @@
+from contextlib import nullcontext
+
+import pytest
+import torch
+
+import whisper
+from whisper.cache import model_dtype, model_sha256
+from whisper.model import KVCache, Linear, disable_sdpa
+
+
+@pytest.mark.parametrize("use_sdpa", [True, False])
+@torch.no_grad()
+def test_fuse_qkv(random_model, use_sdpa):
+    model = random_model()
+    mel = torch.randn(2, 80, 20)
+    tokens = torch.randint(0, 100, (2, 5))
+    state_dict = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+
+    with disable_sdpa() if not use_sdpa else nullcontext():
+        expected = model(mel, tokens)
+        model.fuse_qkv()
+        assert torch.allclose(model(mel, tokens), expected, atol=1e-5)
+
+        audio_features = model.embed_audio(mel)
+        kv_cache = KVCache(model.decoder, 2, torch.float32, torch.device("cpu"))
+        logits = [model.decoder(tokens[:, :3], audio_features, kv_cache=kv_cache)]
+        hooks_cache, hooks = model.install_kv_cache_hooks()
+        hooks_logits = model.decoder(tokens, audio_features, kv_cache=hooks_cache)
+        for hook in hooks:
+            hook.remove()
+        for i in range(3, 5):
+            token = tokens[:, i : i + 1]
+            logits.append(model.decoder(token, audio_features, kv_cache=kv_cache))
+        assert torch.allclose(torch.cat(logits, dim=1), expected, atol=1e-5)
+        assert torch.allclose(hooks_logits, expected, atol=1e-5)
+
+    # the checkpoints are unchanged, and the fused weights follow the projections
+    assert model.state_dict().keys() == state_dict.keys()
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(tensor, state_dict[name]), name
+    attn = model.decoder.blocks[0].attn
+    model.load_state_dict({name: tensor * 2 for name, tensor in state_dict.items()})
+    assert torch.equal(
+        attn.qkv_weight[16:32], 2 * state_dict["decoder.blocks.0.attn.key.weight"]
+    )
+    model.half()
+    assert attn.qkv_weight.dtype == torch.float16
+    assert attn.query.weight.data_ptr() == attn.qkv_weight.data_ptr()
+
+
+@torch.no_grad()
+def test_set_compute_dtype(random_model):
+    model = random_model(n_vocab=51865, n_text_ctx=448)  # for the tokenizer
+    mel = torch.randn(2, 80, 20)
+    tokens = torch.randint(0, 100, (2, 5))
+    expected = model(mel, tokens)
+
+    model.set_compute_dtype(torch.bfloat16)
+    for name, tensor in model.state_dict().items():
+        dtype = torch.float32 if "ln" in name.split(".")[-2] else torch.bfloat16
+        assert tensor.dtype == dtype, name
+    weight = model.decoder.token_embedding.weight
+    assert weight.to(torch.bfloat16) is weight  # the casts in forward are no-ops
+
+    logits = model(mel.bfloat16(), tokens)
+    assert (logits - expected).abs().max() < 0.02 * expected.abs().max()
+
+    mel = torch.randn(80, 20)  # decode() computes in the model's dtype
+    options = whisper.DecodingOptions(language="en", fp16=False, sample_len=5)
+    result = whisper.decode(model, mel, options)
+    assert result.audio_features.dtype == torch.bfloat16
+
+
+@torch.no_grad()
+def test_quantize(random_model):
+    model = random_model(n_vocab=51865, n_text_ctx=448)  # for the tokenizer
+    mel = torch.randn(2, 80, 20)
+    tokens = torch.randint(0, 100, (2, 5))
+    expected = model(mel, tokens)
+
+    model.quantize()
+    assert model.quantization == "int8"
+    assert not any(isinstance(m, Linear) for m in model.modules())
+    logits = model(mel, tokens)
+    assert logits.dtype == torch.float32
+    assert (logits - expected).abs().max() < 0.05 * expected.abs().max()
+    assert len(model_sha256(model)) == 64  # skipping the packed int8 weights
+    assert model_dtype(model) == "torch.float32+int8"
+
+    options = whisper.DecodingOptions(language="en", fp16=False, sample_len=5)
+    result = whisper.decode(model, torch.randn(80, 20), options, beam_size=2)
+    assert result.audio_features.dtype == torch.float32
+    with pytest.raises(ValueError):
+        model.set_compute_dtype(torch.bfloat16)
+
+
+@torch.no_grad()
+def test_decoder_embeddings_dtype(random_model):
+    model = random_model()
+    tokens = torch.randint(0, 100, (2, 5))
+    audio_features = torch.randn(2, 10, 16).half()
+    inputs = []
+    model.decoder.blocks[0].register_forward_pre_hook(
+        lambda module, args: inputs.append(args[0])
+    )
+    model.decoder(tokens, audio_features)
+
+    # the embeddings are added in float32 and then rounded once, like the sum cast to float16
+    embeddings = model.decoder.token_embedding(tokens)
+    embeddings = embeddings + model.decoder.positional_embedding[:5]
+    assert torch.equal(inputs[0], embeddings.half())
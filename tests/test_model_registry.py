@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import whisper
+
+
+def test_get_model(monkeypatch, model_checkpoint):
+    paths = [model_checkpoint("a"), model_checkpoint("b")]
+
+    loads = []
+    load_model = whisper.load_model
+    monkeypatch.setattr(
+        whisper,
+        "load_model",
+        lambda name, **kw: loads.append(name) or load_model(name, **kw),
+    )
+    whisper.clear_models()
+    try:
+        a = whisper.get_model(paths[0], device="cpu")
+        assert whisper.get_model(paths[0], device="cpu") is a
+        a16 = whisper.get_model(paths[0], device="cpu", dtype=torch.float16)
+        assert a16 is not a and next(a16.parameters()).dtype == torch.float16
+        assert len(loads) == 2
+
+        # a budget of a single model keeps the most recently used one
+        whisper.set_model_budget(whisper._model_nbytes(a))
+        b = whisper.get_model(paths[1], device="cpu")
+        assert whisper.get_model(paths[1], device="cpu") is b
+        assert whisper.get_model(paths[0], device="cpu") is not a
+        assert len(loads) == 4
+    finally:
+        whisper.set_model_budget(None)
+        whisper.clear_models()
+
+
+def test_get_model_while_loading(monkeypatch, model_checkpoint):
+    fast_path, slow_path = model_checkpoint("fast"), model_checkpoint("slow")
+
+    loading, release = threading.Event(), threading.Event()
+    loads = []
+    load_model = whisper.load_model
+
+    def slow_load_model(name, **kw):
+        loads.append(name)
+        if name == slow_path:  # e.g. while downloading
+            loading.set()
+            release.wait(timeout=10)
+        return load_model(name, **kw)
+
+    monkeypatch.setattr(whisper, "load_model", slow_load_model)
+    whisper.clear_models()
+    try:
+        fast = whisper.get_model(fast_path, device="cpu")
+        with ThreadPoolExecutor(3) as executor:
+            slow = [
+                executor.submit(whisper.get_model, slow_path, "cpu") for _ in range(2)
+            ]
+            assert loading.wait(timeout=10)
+            # the other models are available while one is loading
+            other = executor.submit(whisper.get_model, fast_path, "cpu")
+            assert other.result(timeout=5) is fast
+            release.set()
+            assert slow[0].result() is slow[1].result()
+        assert loads == [fast_path, slow_path]  # the slow model is only loaded once
+    finally:
+        release.set()
+        whisper.clear_models()
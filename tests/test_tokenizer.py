@@ -1,6 +1,15 @@
+import os
+
 import pytest
 
-from whisper.tokenizer import get_tokenizer
+from whisper import tokenizer
+from whisper.tokenizer import (
+    Tokenizer,
+    compile_encoding,
+    get_encoding,
+    get_tokenizer,
+    load_compiled_encoding,
+)
 
 
 @pytest.mark.parametrize("multilingual", [True, False])
@@ -32,3 +41,20 @@ def test_split_on_unicode():
 
     assert words == [" elle", " est", " l", "'", "\ufffd", "é", "rit", "oire"]
     assert word_tokens == [[8404], [871], [287], [6], [246], [526], [3210], [20378]]
+
+
+@pytest.mark.parametrize("name", ["gpt2", "multilingual"])
+def test_compiled_encoding(name, tmp_path):
+    # the shipped asset is up to date with the .tiktoken file
+    path = compile_encoding(name, str(tmp_path / f"{name}.tokenizer"))
+    asset = os.path.join(
+        os.path.dirname(tokenizer.__file__), "assets", os.path.basename(path)
+    )
+    with open(path, "rb") as f, open(asset, "rb") as g:
+        assert f.read() == g.read()
+
+    compiled = load_compiled_encoding(name)
+    encoding = get_encoding(name)
+    assert all(encoding.encode_single_token(t) == r for t, r in compiled.ranks.items())
+    t = Tokenizer(encoding=encoding, num_languages=99)
+    assert t._find_non_speech_tokens() == t.non_speech_tokens
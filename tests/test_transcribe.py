@@ -1,5 +1,6 @@
 import os
 
+import numpy as np
 import pytest
 import torch
 
@@ -40,3 +41,18 @@ def test_transcribe(model_name: str):
                 timing_checked = True
 
     assert timing_checked
+
+
+def test_transcribe_channels():
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model("tiny.en").to(device)
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+
+    audio = whisper.load_audio(audio_path)
+    stereo = np.stack([audio, audio[::-1]])
+    results = model.transcribe(stereo, temperature=0.0)
+    assert len(results) == 2
+    assert "my fellow americans" in results[0]["text"].lower()
+    for waveform, result in zip(stereo, results):
+        expected = model.transcribe(waveform, temperature=0.0)
+        assert result["text"] == expected["text"]
@@ -1,19 +1,77 @@
 import hashlib
+import importlib
+import inspect
 import io
 import os
-import urllib
+import sys
+import threading
+import types
+import urllib.request
 import warnings
-from typing import List, Optional, Union
+import zipfile
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
-import torch
-from tqdm import tqdm
-
-from .audio import load_audio, log_mel_spectrogram, pad_or_trim
-from .decoding import DecodingOptions, DecodingResult, decode, detect_language
-from .model import ModelDimensions, Whisper
-from .transcribe import transcribe
 from .version import __version__
 
+if TYPE_CHECKING:
+    import torch
+
+    from .audio import (
+        load_audio,
+        log_mel_spectrogram,
+        pad_or_trim,
+        resample,
+        stream_audio,
+    )
+    from .cache import default_cache_dir
+    from .decoding import DecodingOptions, DecodingResult, decode, detect_language
+    from .model import ModelDimensions, Whisper
+    from .transcribe import transcribe
+
+# the public names of the submodules, which are imported when first used, so that importing
+# whisper does not import PyTorch, numba and the rest of the decoding stack
+_LAZY_ATTRIBUTES = {
+    "load_audio": "audio",
+    "log_mel_spectrogram": "audio",
+    "pad_or_trim": "audio",
+    "resample": "audio",
+    "stream_audio": "audio",
+    "default_cache_dir": "cache",
+    "DecodingOptions": "decoding",
+    "DecodingResult": "decoding",
+    "decode": "decoding",
+    "detect_language": "decoding",
+    "ModelDimensions": "model",
+    "Whisper": "model",
+    "transcribe": "transcribe",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
+
+
+class _WhisperModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing the `transcribe` submodule, e.g. from `whisper.model`, sets it as an
+        # attribute of the package, which must remain the `transcribe` function
+        if name == "transcribe" and isinstance(value, types.ModuleType):
+            value = value.transcribe
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _WhisperModule
+
 _MODELS = {
     "tiny.en": "https://openaipublic.azureedge.net/main/whisper/models/d3dd57d32accea0b295c96e26691aa14d8822fac7d9d27d5dc00b4ca2826dd03/tiny.en.pt",
     "tiny": "https://openaipublic.azureedge.net/main/whisper/models/65147644a518d12f04e32d6f3b26facc3f8dd46e5390956a9424a650c0ce22b9/tiny.pt",
@@ -52,6 +110,10 @@ _ALIGNMENT_HEADS = {
 
 
 def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
+    from tqdm import tqdm
+
+    from .cache import record_file_sha256, verified_file_sha256
+
     os.makedirs(root, exist_ok=True)
 
     expected_sha256 = url.split("/")[-2]
@@ -61,15 +123,14 @@ def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
         raise RuntimeError(f"{download_target} exists and is not a regular file")
 
     if os.path.isfile(download_target):
-        with open(download_target, "rb") as f:
-            model_bytes = f.read()
-        if hashlib.sha256(model_bytes).hexdigest() == expected_sha256:
-            return model_bytes if in_memory else download_target
+        if verified_file_sha256(download_target) == expected_sha256:
+            return _read_file(download_target) if in_memory else download_target
         else:
             warnings.warn(
                 f"{download_target} exists, but the SHA256 checksum does not match; re-downloading the file"
             )
 
+    sha256 = hashlib.sha256()
     with urllib.request.urlopen(url) as source, open(download_target, "wb") as output:
         with tqdm(
             total=int(source.info().get("Content-Length")),
@@ -84,15 +145,21 @@ def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
                     break
 
                 output.write(buffer)
+                sha256.update(buffer)
                 loop.update(len(buffer))
 
-    model_bytes = open(download_target, "rb").read()
-    if hashlib.sha256(model_bytes).hexdigest() != expected_sha256:
+    if sha256.hexdigest() != expected_sha256:
         raise RuntimeError(
             "Model has been downloaded but the SHA256 checksum does not not match. Please retry loading the model."
         )
+    record_file_sha256(download_target, expected_sha256)
+
+    return _read_file(download_target) if in_memory else download_target
 
-    return model_bytes if in_memory else download_target
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
 
 
 def available_models() -> List[str]:
@@ -102,10 +169,13 @@ def available_models() -> List[str]:
 
 def load_model(
     name: str,
-    device: Optional[Union[str, torch.device]] = None,
+    device: Optional[Union[str, "torch.device"]] = None,
     download_root: str = None,
     in_memory: bool = False,
-) -> Whisper:
+    dtype: Optional["torch.dtype"] = None,
+    fuse_qkv: bool = False,
+    quantize: Optional[str] = None,
+) -> "Whisper":
     """
     Load a Whisper ASR model
 
@@ -119,19 +189,39 @@ def load_model(
     download_root: str
         path to download the model files; by default, it uses "~/.cache/whisper"
     in_memory: bool
-        whether to preload the model weights into host memory
+        whether to preload the model weights into host memory; otherwise, the checkpoint is
+        memory-mapped and its tensors become the model weights without being copied, if they
+        have the requested dtype and the model is on the CPU, so that processes that load the
+        same model share its pages (with PyTorch 2.1 or later)
+    dtype : torch.dtype
+        the data type of the model weights, float32 by default; the official checkpoints are
+        stored in float16, which the layers cast to the dtype of their inputs when computing
+        in float32, e.g. on the CPU
+    fuse_qkv : bool
+        whether to concatenate the query, key and value weights of each self-attention layer
+        (see `Whisper.fuse_qkv`), which are then copied from a memory-mapped checkpoint
+    quantize : str
+        "int8" to quantize the linear layers dynamically for inference on the CPU, which then
+        computes in float32 (see `Whisper.quantize`); not quantized by default
 
     Returns
     -------
     model : Whisper
         The Whisper ASR model instance
     """
+    import torch
+
+    from .cache import default_cache_dir  # noqa: F811
+    from .model import ModelDimensions, Whisper  # noqa: F811
 
+    if quantize not in (None, "int8"):
+        raise ValueError(f"Unsupported quantization: {quantize}")
+    if quantize is not None and fuse_qkv:
+        raise ValueError("the fused query, key and value weights cannot be quantized")
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
     if download_root is None:
-        default = os.path.join(os.path.expanduser("~"), ".cache")
-        download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+        download_root = default_cache_dir()
 
     if name in _MODELS:
         checkpoint_file = _download(_MODELS[name], download_root, in_memory)
@@ -144,17 +234,160 @@ def load_model(
             f"Model {name} not found; available models = {available_models()}"
         )
 
-    with (
-        io.BytesIO(checkpoint_file) if in_memory else open(checkpoint_file, "rb")
-    ) as fp:
-        checkpoint = torch.load(fp, map_location=device)
-    del checkpoint_file
+    # only checkpoints in the zip format (the default since torch 1.6) can be memory-mapped
+    checkpoint = None
+    if (
+        not in_memory
+        and _supports_mmap_loading()
+        and zipfile.is_zipfile(checkpoint_file)
+    ):
+        checkpoint = torch.load(checkpoint_file, map_location="cpu", mmap=True)
 
-    dims = ModelDimensions(**checkpoint["dims"])
-    model = Whisper(dims)
-    model.load_state_dict(checkpoint["model_state_dict"])
+    if checkpoint is not None:
+        dims = ModelDimensions(**checkpoint["dims"])
+        model = Whisper.from_state_dict(dims, checkpoint["model_state_dict"])
+    else:
+        with (
+            io.BytesIO(checkpoint_file) if in_memory else open(checkpoint_file, "rb")
+        ) as fp:
+            checkpoint = torch.load(fp, map_location=device)
+        dims = ModelDimensions(**checkpoint["dims"])
+        model = Whisper(dims)
+        model.load_state_dict(checkpoint["model_state_dict"])
+    del checkpoint_file, checkpoint
 
     if alignment_heads is not None:
         model.set_alignment_heads(alignment_heads)
+    if name in _MODELS:
+        model.checkpoint_sha256 = _MODELS[name].split("/")[-2]
+
+    model = model.to(device, dtype or torch.float32)
+    if fuse_qkv:
+        model.fuse_qkv()
+    if quantize is not None:
+        model.quantize()
+    return model
+
+
+def _supports_mmap_loading() -> bool:
+    """Whether `torch.load` can memory-map and `load_state_dict` can assign tensors (torch>=2.1)"""
+    import torch
+
+    load_parameters = inspect.signature(torch.load).parameters
+    assign_parameters = inspect.signature(torch.nn.Module.load_state_dict).parameters
+    return "mmap" in load_parameters and "assign" in assign_parameters
+
+
+_model_registry: "OrderedDict[tuple, Whisper]" = OrderedDict()
+_model_registry_lock = threading.Lock()
+# held while a model is loaded, so that it is only loaded once without blocking other models
+_model_loading_locks: Dict[tuple, threading.Lock] = {}
+_model_budget: Optional[int] = None
+
+
+def _model_nbytes(model: "Whisper") -> int:
+    tensors = [*model.parameters(), *model.buffers()]
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def set_model_budget(max_bytes: Optional[int]):
+    """
+    Set the total size of the weights of the models kept by `get_model`, beyond which the least
+    recently used ones are released, or None to keep all of them; the most recently requested
+    model is kept even if it exceeds the budget on its own
+    """
+    global _model_budget
+    with _model_registry_lock:
+        _model_budget = max_bytes
+        _evict_models()
 
-    return model.to(device)
+
+def clear_models():
+    """Release all the models kept by `get_model`"""
+    with _model_registry_lock:
+        _model_registry.clear()
+
+
+def _evict_models(keep: Optional[tuple] = None):
+    import torch
+
+    if _model_budget is None:
+        return
+    total = sum(_model_nbytes(model) for model in _model_registry.values())
+    for key in list(_model_registry):
+        if total <= _model_budget:
+            break
+        if key != keep:
+            total -= _model_nbytes(_model_registry.pop(key))
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def get_model(
+    name: str,
+    device: Optional[Union[str, "torch.device"]] = None,
+    dtype: Optional["torch.dtype"] = None,
+    download_root: str = None,
+) -> "Whisper":
+    """
+    Return a Whisper model shared by all the callers in this process, loading it with
+    `load_model` the first time it is requested with the same name, device and dtype. Threads
+    requesting a model that is being loaded wait for it, while the other models can be
+    requested, and loaded, in the meantime.
+
+    Once the weights of the loaded models exceed the budget set with `set_model_budget`, the
+    least recently used models are released from the registry; the callers that still hold one
+    can use it until they let it go, and it is loaded again when it is next requested.
+
+    Parameters
+    ----------
+    name : str
+        one of the official model names listed by `whisper.available_models()`, or
+        path to a model checkpoint containing the model dimensions and the model state_dict.
+    device : Union[str, torch.device]
+        the PyTorch device to put the model into
+    dtype : torch.dtype
+        the data type to cast the model weights to, e.g. torch.float16; float32 by default
+    download_root: str
+        path to download the model files; by default, it uses "~/.cache/whisper"
+
+    Returns
+    -------
+    model : Whisper
+        The Whisper ASR model instance, which must not be modified by the caller
+    """
+    import torch
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+    if device.type == "cuda" and device.index is None:
+        device = torch.device("cuda", torch.cuda.current_device())
+    if name not in _MODELS:
+        name = os.path.abspath(name)
+    key = (name, str(device), dtype or torch.float32)
+
+    with _model_registry_lock:
+        if key in _model_registry:
+            _model_registry.move_to_end(key)
+            return _model_registry[key]
+        loading_lock = _model_loading_locks.setdefault(key, threading.Lock())
+
+    with loading_lock:
+        try:
+            with _model_registry_lock:
+                if key in _model_registry:  # loaded by another thread in the meantime
+                    _model_registry.move_to_end(key)
+                    return _model_registry[key]
+
+            model = load_model(
+                name, device=device, download_root=download_root, dtype=dtype
+            )
+            with _model_registry_lock:
+                _model_registry[key] = model
+                _evict_models(keep=key)
+            return model
+        finally:
+            with _model_registry_lock:
+                if _model_loading_locks.get(key) is loading_lock:
+                    del _model_loading_locks[key]
@@ -1,12 +1,22 @@
+import math
 import os
+import re
+import struct
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import lru_cache
-from subprocess import CalledProcessError, run
-from typing import Optional, Union
+from subprocess import PIPE, CalledProcessError, Popen, run
+from tempfile import TemporaryFile
+from threading import Thread
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torch.nn.functional as F
+from numpy.lib.stride_tricks import sliding_window_view
 
+from .cache import DiskCache, audio_sha256
 from .utils import exact_div
 
 # hard-coded audio hyperparameters
@@ -17,49 +27,658 @@ CHUNK_LENGTH = 30
 N_SAMPLES = CHUNK_LENGTH * SAMPLE_RATE  # 480000 samples in a 30-second chunk
 N_FRAMES = exact_div(N_SAMPLES, HOP_LENGTH)  # 3000 frames in a mel spectrogram input
 
+MEL_BLOCK_FRAMES = 10 * N_FRAMES  # frames per block when computing long spectrograms
+# seconds of audio per ffmpeg process when decoding in parallel
+MIN_DECODE_SEGMENT = 2 * 60
+DECODE_SEGMENT_OVERLAP = 0.5  # seconds decoded before each segment and then discarded
+
 N_SAMPLES_PER_TOKEN = HOP_LENGTH * 2  # the initial convolutions has stride 2
 FRAMES_PER_SECOND = exact_div(SAMPLE_RATE, HOP_LENGTH)  # 10ms per audio frame
 TOKENS_PER_SECOND = exact_div(SAMPLE_RATE, N_SAMPLES_PER_TOKEN)  # 20ms per audio token
 
 
-def load_audio(file: str, sr: int = SAMPLE_RATE):
-    """
-    Open an audio file and read as mono waveform, resampling as necessary
+AudioFile = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+READ_SIZE = 1 << 20  # bytes read at a time from file-like objects fed to ffmpeg
 
-    Parameters
-    ----------
-    file: str
-        The audio file to open
 
-    sr: int
-        The sample rate to resample the audio if necessary
+def _is_audio_file(audio) -> bool:
+    """Whether `audio` is a path, encoded audio data in memory, or a binary file-like object"""
+    return isinstance(
+        audio, (str, os.PathLike, bytes, bytearray, memoryview)
+    ) or hasattr(audio, "read")
 
-    Returns
-    -------
-    A NumPy array containing the audio waveform, in float32 dtype.
-    """
 
+def _ffmpeg_command(
+    file: AudioFile,
+    sr: int,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+    channels: int = 1,
+):
     # This launches a subprocess to decode audio while down-mixing
     # and resampling as necessary.  Requires the ffmpeg CLI in PATH.
+    # Seeking with -ss before -i skips the preceding part of the input without decoding it.
+    # Audio that is not a path is written to the standard input of ffmpeg.
+    if isinstance(file, str):
+        cmd = ["ffmpeg", "-nostdin", "-threads", "0"]
+    else:
+        cmd, file = ["ffmpeg", "-threads", "0"], "pipe:0"
+    if start:
+        cmd += ["-ss", f"{start:.6f}"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]
     # fmt: off
-    cmd = [
-        "ffmpeg",
-        "-nostdin",
-        "-threads", "0",
+    return cmd + [
         "-i", file,
         "-f", "s16le",
-        "-ac", "1",
+        "-ac", str(channels),
         "-acodec", "pcm_s16le",
         "-ar", str(sr),
         "-"
     ]
     # fmt: on
+
+
+def _write_stdin(process: Popen, data: bytes) -> bool:
+    try:
+        process.stdin.write(data)
+        return True
+    except (BrokenPipeError, ValueError):
+        return False  # ffmpeg exited early, e.g. after the requested duration or on an error
+
+
+def _feed_stdin(process: Popen, file: AudioFile, errors: List[Exception]):
+    """Write the file to the standard input of ffmpeg, appending any error reading it to `errors`"""
     try:
-        out = run(cmd, capture_output=True, check=True).stdout
-    except CalledProcessError as e:
-        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+        if hasattr(file, "read"):
+            while (data := file.read(READ_SIZE)) and _write_stdin(process, data):
+                pass
+        else:
+            _write_stdin(process, file)
+    except Exception as e:
+        # ffmpeg would decode the part read so far as if it were the whole file
+        errors.append(e)
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+@contextmanager
+def _open_ffmpeg(
+    file: AudioFile,
+    sr: int,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+    channels: int = 1,
+) -> Iterator[Tuple[Popen, BinaryIO]]:
+    """
+    Start ffmpeg decoding the file to int16 samples on its standard output, and yield the process
+    along with the file collecting its standard error. Audio that is not a path is fed to ffmpeg
+    from a writer thread, and an error reading it is raised on exit. The process is killed if
+    it is still running on exit.
+    """
+    # stderr goes to a file so that a chatty ffmpeg cannot block on a full pipe
+    with TemporaryFile() as stderr:
+        cmd = _ffmpeg_command(file, sr, start, duration, channels)
+        stdin = None if isinstance(file, str) else PIPE
+        process = Popen(cmd, stdin=stdin, stdout=PIPE, stderr=stderr)
+        writer = None
+        errors = []
+        if stdin is not None:
+            writer = Thread(
+                target=_feed_stdin, args=(process, file, errors), daemon=True
+            )
+            writer.start()
+        try:
+            yield process, stderr
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+            if writer is not None:
+                writer.join()
+            if errors:
+                raise errors[0]
+
+
+def _check_ffmpeg(process: Popen, stderr: BinaryIO):
+    if process.wait() != 0:
+        stderr.seek(0)
+        raise RuntimeError(f"Failed to load audio: {stderr.read().decode()}")
+
+
+def load_audio(
+    file: AudioFile,
+    sr: int = SAMPLE_RATE,
+    dtype: type = np.float32,
+    *,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+    num_workers: int = 1,
+    channels: int = 1,
+):
+    """
+    Open an audio file and read as mono waveform, resampling as necessary.
+    WAV files that are already mono 16-bit PCM at the sample rate `sr` are memory-mapped
+    instead of being decoded by ffmpeg, as are the samples of files previously decoded into
+    the cache set with `set_pcm_cache`.
+
+    Parameters
+    ----------
+    file: Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+        The audio file to open, or the contents of an audio file in memory or as a binary
+        file-like object, which are piped to ffmpeg; formats that require seeking in the input,
+        such as MP4 files with the index at the end, cannot be decoded this way
+
+    sr: int
+        The sample rate to resample the audio if necessary
+
+    dtype: type
+        Either np.float32, or np.int16 to return the decoded 16-bit samples as they are, which
+        takes half the memory and avoids any copy; `log_mel_spectrogram` and `transcribe`
+        accept int16 waveforms and convert them to float32 one block at a time.
+
+    start: Optional[float]
+        If given, only decode the audio from this timestamp (in seconds) onwards
+
+    duration: Optional[float]
+        If given, only decode up to this many seconds of audio
+
+    num_workers: int
+        The maximum number of ffmpeg processes decoding disjoint parts of a long file in parallel,
+        each covering at least MIN_DECODE_SEGMENT seconds; the duration of the file is probed
+        first, and it is decoded by a single process if it cannot be determined. The result
+        matches a serial decode for PCM and lossless codecs such as FLAC, while lossy codecs
+        such as AAC or MP3 may differ slightly around the segment boundaries
+
+    channels: int
+        The number of channels to decode, down-mixing or up-mixing as necessary; with more than
+        one channel, the waveform has one row per channel
+
+    Returns
+    -------
+    A NumPy array containing the audio waveform, in float32 dtype or as a read-only int16 array,
+    of shape (n_samples,), or (channels, n_samples) if `channels` is more than one.
+    """
+    _check_audio_dtype(dtype)
+    if isinstance(file, os.PathLike):
+        file = os.fspath(file)
+    if channels == 1 and isinstance(file, str):
+        pcm = _map_wav_pcm(file, sr)
+        if pcm is not None:
+            return _pcm_to_dtype(_slice_pcm(pcm, sr, start, duration), dtype)
+
+    cache_key = _pcm_cache_key(file, sr, channels)
+    if cache_key is not None:
+        pcm = _pcm_cache.get(cache_key)
+        if pcm is not None:
+            return _pcm_to_dtype(_slice_pcm(pcm, sr, start, duration), dtype)
+        if start is not None or duration is not None:
+            cache_key = None  # only the whole file is cached
+
+    pcm = _decode_audio(file, sr, start, duration, num_workers, channels)
+    if cache_key is not None:
+        cached = _pcm_cache.put(cache_key, pcm)
+        if cached is not None:
+            pcm = cached
+    return _pcm_to_dtype(pcm, dtype)
+
+
+def _slice_pcm(
+    pcm: np.ndarray, sr: int, start: Optional[float], duration: Optional[float]
+) -> np.ndarray:
+    first = round((start or 0) * sr)
+    last = None if duration is None else first + round(duration * sr)
+    return pcm[..., first:last]
+
+
+def _decode_audio(
+    file: AudioFile,
+    sr: int,
+    start: Optional[float],
+    duration: Optional[float],
+    num_workers: int,
+    channels: int,
+) -> np.ndarray:
+    """Decode the file with ffmpeg to int16 samples, as in `load_audio`"""
+    if channels == 1 and isinstance(file, str) and num_workers > 1:
+        pcm = _load_audio_parallel(file, sr, start, duration, num_workers)
+        if pcm is not None:
+            return pcm
+
+    if isinstance(file, str):
+        try:
+            cmd = _ffmpeg_command(file, sr, start, duration, channels)
+            out = run(cmd, capture_output=True, check=True).stdout
+        except CalledProcessError as e:
+            raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+    else:
+        with _open_ffmpeg(file, sr, start, duration, channels) as (process, stderr):
+            out = process.stdout.read()
+            _check_ffmpeg(process, stderr)
+
+    pcm = np.frombuffer(out, np.int16)
+    if channels > 1:
+        # ffmpeg interleaves the samples of the channels
+        pcm = np.ascontiguousarray(pcm.reshape(-1, channels).T)
+        pcm.flags.writeable = False
+    return pcm
+
+
+_pcm_cache: Optional[DiskCache] = None
+
+
+def set_pcm_cache(cache: Optional[DiskCache]):
+    """
+    Keep the int16 samples that `load_audio` decodes from audio files in the given cache,
+    so that later calls on the same file memory-map them instead of running ffmpeg again;
+    None disables the cache. Entries are keyed by the path, size and modification time of
+    the file, with the sample rate and the number of channels.
+    """
+    global _pcm_cache
+    _pcm_cache = cache
+
+
+def _pcm_cache_key(file: AudioFile, sr: int, channels: int) -> Optional[str]:
+    if _pcm_cache is None or not isinstance(file, str):
+        return None
+    try:
+        stat = os.stat(file)
+    except OSError:
+        return None  # let ffmpeg report the error
+    path = os.path.abspath(file)
+    return DiskCache.key("pcm", path, stat.st_size, stat.st_mtime_ns, sr, channels)
+
+
+def _map_wav_pcm(file: Union[str, os.PathLike], sr: int) -> Optional[np.ndarray]:
+    """
+    Memory-map the samples of a WAV file that is already mono 16-bit PCM at the sample rate `sr`,
+    so that it can be read without ffmpeg; returns None for any other file.
+    """
+    try:
+        with open(os.fspath(file), "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+                return None
+            file_size = os.fstat(f.fileno()).st_size
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(chunk_size)
+                elif chunk_id == b"data":
+                    break
+                else:
+                    f.seek(chunk_size, os.SEEK_CUR)
+                if chunk_size % 2 == 1:
+                    f.seek(1, os.SEEK_CUR)  # chunks are padded to an even size
+            offset = f.tell()
+    except OSError:
+        return None  # let ffmpeg report the error
+
+    if fmt is None or len(fmt) < 16:
+        return None
+    format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == 0xFFFE and len(fmt) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+        (format_tag,) = struct.unpack("<H", fmt[24:26])
+    if (format_tag, channels, sample_rate, bits) != (1, 1, sr, 16):
+        return None
+
+    # the data size is left unset in WAV files written to a pipe, e.g. by ffmpeg
+    data_size = min(chunk_size, file_size - offset)
+    if data_size < 2:
+        return np.zeros(0, np.int16)
+    return np.memmap(file, np.int16, mode="r", offset=offset, shape=(data_size // 2,))
+
+
+def _probe_duration(file: str) -> Optional[float]:
+    # ffmpeg reports the duration of its input when given no output file,
+    # which spares requiring ffprobe in addition to ffmpeg
+    result = run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-i", file], capture_output=True
+    )
+    match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d*)?)", result.stderr)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _read_pcm(stream, view: memoryview) -> int:
+    """Read from the stream until the view is full or the stream ends; returns the bytes read"""
+    n_bytes = 0
+    while n_bytes < len(view):
+        n_read = stream.readinto(view[n_bytes:])
+        if not n_read:
+            break
+        n_bytes += n_read
+    return n_bytes
+
+
+def _decode_segment(
+    file: str, sr: int, out: np.ndarray, start: int, end: Optional[int], offset: float
+) -> Tuple[int, Optional[np.ndarray]]:
+    """
+    Decode the samples [start, end) of the file, counted from `offset` seconds, into `out`.
+    Decoding starts DECODE_SEGMENT_OVERLAP seconds early, and these samples are discarded,
+    so that the decoder and resampler have settled by the start of the segment.
+    With `end=None`, the file is decoded until its end, and the samples that do not fit
+    in `out` are returned separately. Returns the number of samples written to `out`.
+    """
+    overlap = min(round(DECODE_SEGMENT_OVERLAP * sr), start)
+    duration = None if end is None else (overlap + end - start) / sr + 1.0
+    seek = offset + (start - overlap) / sr
+
+    with _open_ffmpeg(file, sr, seek, duration) as (process, stderr):
+        _read_pcm(process.stdout, memoryview(bytearray(overlap * 2)))
+        stop = len(out) if end is None else end
+        n_bytes = _read_pcm(process.stdout, memoryview(out[start:stop]).cast("B"))
+        remainder = None
+        if end is None:
+            remainder = np.frombuffer(process.stdout.read(), np.int16)
+        elif n_bytes == (stop - start) * 2:
+            # the rest of the decoded audio belongs to the next segment
+            return n_bytes // 2, None
+
+        _check_ffmpeg(process, stderr)
+        return n_bytes // 2, remainder
+
+
+def _load_audio_parallel(
+    file: str,
+    sr: int,
+    start: Optional[float],
+    duration: Optional[float],
+    num_workers: int,
+) -> Optional[np.ndarray]:
+    """
+    Decode a long file with up to `num_workers` ffmpeg processes running on disjoint time ranges,
+    stitching their int16 samples into a single preallocated buffer at whole-second boundaries.
+    The samples match a serial decode only for codecs that decode identically from any seek
+    point, such as PCM and FLAC; lossy codecs are primed with DECODE_SEGMENT_OVERLAP seconds,
+    but can still differ slightly near the boundaries.
+    Returns None if the file is too short to be split, or if its duration is unknown.
+    """
+    offset = start or 0.0
+    until_end = duration is None
+    if until_end:
+        file_duration = _probe_duration(file)
+        if file_duration is None:
+            return None
+        duration = file_duration - offset
+
+    n_segments = min(num_workers, int(duration // MIN_DECODE_SEGMENT))
+    if n_segments <= 1:
+        return None
+
+    # segments start on whole seconds, so that the seek points fall on input samples too;
+    # the last segment is decoded until the end of the file, as the probed duration
+    # can be slightly off, and one second of slack keeps it within the buffer in general
+    n_samples = round(duration * sr)
+    bounds = [round(duration * i / n_segments) * sr for i in range(n_segments)]
+    bounds.append(None if until_end else n_samples)
+    out = np.empty(n_samples + sr, np.int16)
+
+    def decode(i: int):
+        return _decode_segment(file, sr, out, bounds[i], bounds[i + 1], offset)
+
+    with ThreadPoolExecutor(n_segments) as executor:
+        results = list(executor.map(decode, range(n_segments)))
+
+    for i, (n_decoded, _) in enumerate(results[:-1]):
+        if n_decoded < bounds[i + 1] - bounds[i]:
+            return None  # the file is shorter than its reported duration
+
+    n_decoded, remainder = results[-1]
+    end = bounds[-2] + n_decoded
+    if remainder is not None and len(remainder) > 0:
+        return np.concatenate([out[:end], remainder])
+    return out[:end]
+
+
+def _check_audio_dtype(dtype: type):
+    if np.dtype(dtype) not in (np.float32, np.int16):
+        raise ValueError(f"Unsupported audio dtype: {np.dtype(dtype)}")
+
+
+def _pcm_to_dtype(pcm: np.ndarray, dtype: type) -> np.ndarray:
+    if np.dtype(dtype) == np.int16:
+        return pcm
+    audio = pcm.astype(np.float32)
+    audio /= 32768.0
+    return audio
+
+
+def stream_audio(
+    file: AudioFile,
+    sr: int = SAMPLE_RATE,
+    chunk_seconds: float = CHUNK_LENGTH,
+    dtype: type = np.float32,
+    *,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Open an audio file and read it as mono waveform chunks, resampling as necessary.
+    Unlike `load_audio`, the decoded stream is consumed incrementally while ffmpeg is
+    running, so only one chunk of audio is held in memory at a time.
+
+    Parameters
+    ----------
+    file: Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+        The audio file to open, or its contents, as in `load_audio`
+
+    sr: int
+        The sample rate to resample the audio if necessary
+
+    chunk_seconds: float
+        The duration of each yielded chunk, in seconds
+
+    dtype: type
+        Either np.float32 or np.int16, as in `load_audio`
+
+    start: Optional[float]
+        If given, only decode the audio from this timestamp (in seconds) onwards
+
+    duration: Optional[float]
+        If given, only decode up to this many seconds of audio
+
+    Yields
+    ------
+    NumPy arrays containing consecutive parts of the audio waveform, in the requested dtype.
+    Every chunk holds `chunk_seconds * sr` samples, except possibly the last one.
+    """
+    _check_audio_dtype(dtype)
+    if isinstance(file, os.PathLike):
+        file = os.fspath(file)
+    chunk_size = round(chunk_seconds * sr)
+    # the same buffer is reused for reading every chunk of int16 samples
+    buffer = bytearray(chunk_size * 2)
+    view = memoryview(buffer)
+
+    # ffmpeg is killed on exit if the consumer stopped iterating before the end
+    with _open_ffmpeg(file, sr, start, duration) as (process, stderr):
+        while True:
+            n_bytes = _read_pcm(process.stdout, view)
+            n_samples = n_bytes // 2
+            if n_samples > 0:
+                pcm = np.frombuffer(buffer, np.int16, count=n_samples)
+                if np.dtype(dtype) == np.int16:
+                    yield pcm.copy()  # the buffer is overwritten by the next read
+                else:
+                    yield _pcm_to_dtype(pcm, dtype)
+            if n_bytes < len(buffer):
+                break
+
+        _check_ffmpeg(process, stderr)
+
 
-    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+class Resampler:
+    """
+    A polyphase resampler for waveforms at an arbitrary sample rate, which can be fed one block
+    of samples at a time, e.g. the chunks of an audio stream. Every output sample is computed
+    from the input samples around it with a Hann-windowed sinc filter, low-passed below the
+    lower of the two Nyquist frequencies. The filter coefficients for each of the output phases
+    are computed once, and the outputs sharing a phase are filtered with a single matrix product
+    over a strided view of the input.
+
+    Output samples are produced as soon as their right context has been received, so the output
+    of a block lags behind its input by `zeros / cutoff` input samples, which are returned
+    when the final block is given. Feeding the blocks of a waveform one at a time gives the same
+    samples as resampling it as a whole, up to floating-point rounding.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int = SAMPLE_RATE, zeros: int = 16):
+        """
+        Parameters
+        ----------
+        orig_sr: int
+            The sample rate of the input waveform
+
+        target_sr: int
+            The sample rate to resample to
+
+        zeros: int
+            The number of zero crossings of the sinc filter on each side, trading speed for
+            a sharper transition band
+        """
+        gcd = math.gcd(orig_sr, target_sr)
+        self.up, self.down = target_sr // gcd, orig_sr // gcd
+
+        # output n is at input position n * down / up, between the input samples
+        # base = n * down // up and base + 1, at the fraction phase / up
+        cutoff = min(1.0, self.up / self.down) * 0.95
+        self.width = math.ceil(zeros / cutoff)  # filter half-width in input samples
+        offsets = np.arange(-self.width, self.width + 1)
+        t = np.arange(self.up)[:, None] / self.up - offsets[None, :]
+        window = np.cos(np.clip(t / (self.width + 1), -1, 1) * np.pi / 2) ** 2
+        self.filters = (cutoff * np.sinc(cutoff * t) * window).astype(np.float32)
+
+        # the input received so far, from sample index `_start` on, after `width` zeros
+        self._buffer = np.zeros(self.width, np.float32)
+        self._start = -self.width
+        self._n_input = 0
+        self._n_output = 0
+
+    def __call__(self, audio: np.ndarray, final: bool = False) -> np.ndarray:
+        """
+        Resample the next block of the waveform, along its last axis
+
+        Parameters
+        ----------
+        audio: np.ndarray, shape = (*, n_samples)
+            The next samples of the waveform, in float32 or int16
+
+        final: bool
+            Whether this is the last block, so that the remaining output is produced
+
+        Returns
+        -------
+        np.ndarray, shape = (*, n_output)
+            The resampled waveform in float32, continuing the output of the previous calls
+        """
+        audio = np.asarray(audio)
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) / 32768.0
+        audio = audio.astype(np.float32, copy=False)
+        if self._n_input == 0 and audio.ndim > 1:
+            self._buffer = np.zeros(audio.shape[:-1] + (self.width,), np.float32)
+        self._n_input += audio.shape[-1]
+
+        pieces = [self._buffer, audio]
+        if final:
+            # the output covers the input duration, with zeros after its end
+            pieces.append(np.zeros(audio.shape[:-1] + (self.width,), np.float32))
+            end = -(-self._n_input * self.up // self.down)
+        else:
+            # output n is available once the input sample base + width has been received
+            n_available = self._n_input - self.width
+            end = max(0, -(-n_available * self.up // self.down))
+        buffer = np.concatenate(pieces, axis=-1)
+
+        n = np.arange(self._n_output, max(end, self._n_output))
+        base, phase = np.divmod(n * self.down, self.up)
+        base -= self._start + self.width  # the first input sample of each window
+        output = np.empty(buffer.shape[:-1] + (len(n),), np.float32)
+        if len(n) >= self.up:
+            # the outputs n, n + up, n + 2 * up, ... share a phase and their windows start
+            # `down` samples apart, so they are a strided view multiplied by a single filter
+            windows = sliding_window_view(buffer, self.filters.shape[-1], axis=-1)
+            for i in range(self.up):
+                count = len(range(i, len(n), self.up))
+                rows = windows[..., base[i] :: self.down, :][..., :count, :]
+                output[..., i :: self.up] = rows @ self.filters[phase[i]]
+        else:
+            index = base[:, None] + np.arange(self.filters.shape[-1])
+            output[:] = np.einsum(
+                "...nk,nk->...n", buffer[..., index], self.filters[phase]
+            )
+        self._n_output += len(n)
+
+        # keep the input samples needed by the next outputs
+        next_base = self._n_output * self.down // self.up
+        keep_from = min(max(next_base - self.width - self._start, 0), buffer.shape[-1])
+        self._buffer = buffer[..., keep_from:]
+        self._start += keep_from
+        return output
+
+    def flush(self) -> np.ndarray:
+        """Return the remaining output after the last block, as `final=True` would"""
+        return self(np.zeros(self._buffer.shape[:-1] + (0,), np.float32), final=True)
+
+
+def resample(
+    audio: Union[np.ndarray, torch.Tensor], orig_sr: int, target_sr: int = SAMPLE_RATE
+) -> np.ndarray:
+    """
+    Resample a waveform to `target_sr` along its last axis, with a `Resampler`
+
+    Parameters
+    ----------
+    audio: Union[np.ndarray, torch.Tensor], shape = (*, n_samples)
+        The waveform in float32 or int16
+
+    orig_sr: int
+        The sample rate of the waveform
+
+    target_sr: int
+        The sample rate to resample to
+
+    Returns
+    -------
+    np.ndarray, shape = (*, ceil(n_samples * target_sr / orig_sr))
+        The resampled waveform, in float32
+    """
+    if torch.is_tensor(audio):
+        audio = audio.cpu().numpy()
+    if orig_sr == target_sr:
+        return _pcm_to_dtype(audio, np.float32) if audio.dtype == np.int16 else audio
+    return Resampler(orig_sr, target_sr)(audio, final=True)
+
+
+def _resample_chunks(
+    chunks: Iterable[np.ndarray], orig_sr: int
+) -> Iterator[np.ndarray]:
+    resampler = Resampler(orig_sr)
+    for chunk in chunks:
+        yield resampler(chunk)
+    yield resampler.flush()
+
+
+def _resample_input(audio: Tuple[Union[np.ndarray, Iterable[np.ndarray]], int]):
+    """Resample audio given as (waveform, sample_rate) or (chunks, sample_rate) to SAMPLE_RATE"""
+    audio, sample_rate = audio
+    if sample_rate == SAMPLE_RATE:
+        return audio
+    if isinstance(audio, np.ndarray) or torch.is_tensor(audio):
+        return resample(audio, sample_rate)
+    return _resample_chunks(audio, sample_rate)
 
 
 def pad_or_trim(array, length: int = N_SAMPLES, *, axis: int = -1):
@@ -107,19 +726,159 @@ def mel_filters(device, n_mels: int) -> torch.Tensor:
         return torch.from_numpy(f[f"mel_{n_mels}"]).to(device)
 
 
+def _to_tensor(audio: Union[np.ndarray, torch.Tensor]) -> torch.Tensor:
+    if torch.is_tensor(audio):
+        return audio
+    if not audio.flags.writeable:
+        # e.g. the int16 audio from `load_audio`, which is a view over the ffmpeg output;
+        # the tensor is only ever read from, so sharing the read-only memory is safe.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            return torch.from_numpy(audio)
+    return torch.from_numpy(audio)
+
+
+def _padded_slice(
+    audio: torch.Tensor, start: int, end: int, length: int, offset: int = 0
+) -> torch.Tensor:
+    """
+    Return the samples [start, end) of the signal that `torch.stft(center=True)` sees, i.e.
+    `audio` zero-padded to `length` samples and then reflect-padded by N_FFT // 2 on both
+    sides. Indices are relative to the unpadded signal, of which `audio` holds the samples
+    from `offset` onwards.
+    """
+    n_samples = audio.shape[-1]
+    if offset <= start and end <= offset + n_samples:
+        return audio[..., start - offset : end - offset]
+
+    def gather(index: torch.Tensor) -> torch.Tensor:
+        index = index - offset
+        valid = (index >= 0) & (index < n_samples)
+        result = audio.new_zeros(*audio.shape[:-1], index.shape[0])
+        result[..., valid] = audio[..., index[valid]]
+        return result
+
+    parts = []
+    if start < 0:  # reflection of the beginning
+        index = torch.arange(start, min(end, 0), device=audio.device)
+        parts.append(gather(-index))
+
+    inner_start, inner_end = max(start, 0), min(end, length)
+    data_end = max(inner_start, min(inner_end, offset + n_samples))
+    if inner_start < data_end:
+        parts.append(audio[..., inner_start - offset : data_end - offset])
+    if data_end < inner_end:  # zero padding
+        parts.append(audio.new_zeros(*audio.shape[:-1], inner_end - data_end))
+
+    if end > length:  # reflection of the end
+        index = torch.arange(max(start, length), end, device=audio.device)
+        parts.append(gather(2 * (length - 1) - index))
+
+    return torch.cat(parts, dim=-1)
+
+
+def _mel_frames(
+    audio: torch.Tensor,
+    start: int,
+    end: int,
+    length: int,
+    filters: torch.Tensor,
+    offset: int = 0,
+) -> torch.Tensor:
+    """
+    Compute the Mel power spectrum of the STFT frames [start, end) of a signal that is
+    `length` samples long after padding, using only the samples these frames cover;
+    the result is identical to the corresponding frames of a single full-length STFT.
+    """
+    samples = _padded_slice(
+        audio,
+        start * HOP_LENGTH - N_FFT // 2,
+        (end - 1) * HOP_LENGTH + N_FFT // 2,
+        length,
+        offset,
+    )
+    if samples.dtype == torch.int16:
+        samples = samples.float() / 32768.0
+
+    window = torch.hann_window(N_FFT).to(samples.device)
+    stft = torch.stft(
+        samples, N_FFT, HOP_LENGTH, window=window, center=False, return_complex=True
+    )
+    magnitudes = stft.abs() ** 2
+    if magnitudes.shape[-1] == 1:
+        # a single frame would be dispatched to a matrix-vector product, which sums in a
+        # different order than the matrix-matrix product used for the full spectrogram
+        return (filters @ magnitudes.repeat_interleave(2, dim=-1))[..., :1]
+    return filters @ magnitudes
+
+
+def _iter_mel_blocks(
+    chunks: Iterable[Union[np.ndarray, torch.Tensor]],
+    n_mels: int,
+    padding: int,
+    device: Optional[Union[str, torch.device]],
+) -> Iterator[torch.Tensor]:
+    """
+    Compute the Mel power spectrum of a waveform given as consecutive chunks, e.g. from
+    `stream_audio`, keeping only the few samples that overlap the next STFT frame.
+    Yields consecutive blocks of frames, which together form the full spectrogram.
+    """
+    buffer = None  # holds the received samples from `offset` onwards
+    offset = received = frame = 0
+
+    for chunk in chunks:
+        chunk = _to_tensor(chunk)
+        if device is not None:
+            chunk = chunk.to(device)
+        buffer = chunk if buffer is None else torch.cat([buffer, chunk], dim=-1)
+        received += chunk.shape[-1]
+
+        # compute the frames that are entirely covered by the samples received so far
+        end = (received - N_FFT // 2) // HOP_LENGTH + 1
+        if end > frame:
+            filters = mel_filters(buffer.device, n_mels)
+            yield _mel_frames(buffer, frame, end, received + padding, filters, offset)
+            frame = end
+
+            # discard the samples that no remaining frame will need
+            discard = frame * HOP_LENGTH - N_FFT // 2 - offset
+            if discard > 0:
+                buffer = buffer[..., discard:]
+                offset += discard
+
+    if buffer is None:
+        buffer = torch.zeros(0, device=device)  # an empty stream
+
+    length = received + padding
+    if length // HOP_LENGTH > frame:
+        filters = mel_filters(buffer.device, n_mels)
+        yield _mel_frames(buffer, frame, length // HOP_LENGTH, length, filters, offset)
+
+
 def log_mel_spectrogram(
-    audio: Union[str, np.ndarray, torch.Tensor],
+    audio: Union[
+        AudioFile,
+        np.ndarray,
+        torch.Tensor,
+        Iterable[np.ndarray],
+        Tuple[np.ndarray, int],
+    ],
     n_mels: int = 80,
     padding: int = 0,
     device: Optional[Union[str, torch.device]] = None,
+    num_workers: Optional[int] = None,
 ):
     """
     Compute the log-Mel spectrogram of
 
     Parameters
     ----------
-    audio: Union[str, np.ndarray, torch.Tensor], shape = (*)
-        The path to audio or either a NumPy array or Tensor containing the audio waveform in 16 kHz
+    audio: Union[AudioFile, np.ndarray, torch.Tensor, Iterable[np.ndarray], Tuple[np.ndarray, int]], shape = (*)
+        The path to audio or its contents as accepted by `load_audio`,
+        or either a NumPy array or Tensor containing the audio waveform in 16 kHz
+        (as float32, or int16 samples which are converted one block at a time), or an iterable
+        of consecutive waveform chunks such as the one returned by `stream_audio`,
+        or a tuple of such a waveform or chunks and their sample rate, to be resampled
 
     n_mels: int
         The number of Mel-frequency filters, only 80 is supported
@@ -130,28 +889,304 @@ def log_mel_spectrogram(
     device: Optional[Union[str, torch.device]]
         If given, the audio tensor is moved to this device before STFT
 
+    num_workers: Optional[int]
+        The number of threads computing blocks of MEL_BLOCK_FRAMES frames in parallel on CPU,
+        using `torch.get_num_threads()` by default. If given, it is also the number of ffmpeg
+        processes decoding a long audio file, see `load_audio`; a single process is used
+        by default, as the output of lossy codecs can differ slightly when decoded in parallel
+
     Returns
     -------
     torch.Tensor, shape = (80, n_frames)
-        A Tensor that contains the Mel spectrogram
+        A Tensor that contains the Mel spectrogram, which is read-only and memory-mapped
+        when it is found in the cache set with `set_mel_cache`
     """
+    cache_key = _mel_cache_key(audio, n_mels, padding)
+    if cache_key is not None:
+        cached = _mel_cache.get(cache_key)
+        if cached is not None:
+            mel = _to_tensor(cached)
+            return mel if device is None else mel.to(device)
+
+    mel = _log_mel_spectrogram(audio, n_mels, padding, device, num_workers)
+    if cache_key is not None:
+        _mel_cache.put(cache_key, mel.cpu().numpy())
+    return mel
+
+
+def _log_mel_spectrogram(
+    audio: Union[
+        AudioFile,
+        np.ndarray,
+        torch.Tensor,
+        Iterable[np.ndarray],
+        Tuple[np.ndarray, int],
+    ],
+    n_mels: int,
+    padding: int,
+    device: Optional[Union[str, torch.device]],
+    num_workers: Optional[int],
+) -> torch.Tensor:
+    # parallel decoding is opt-in, while the Mel blocks are always computed on all threads
+    decode_workers = num_workers or 1
+    if num_workers is None:
+        num_workers = torch.get_num_threads()
+    if isinstance(audio, tuple):
+        audio = _resample_input(audio)
+
     if not torch.is_tensor(audio):
-        if isinstance(audio, str):
-            audio = load_audio(audio)
-        audio = torch.from_numpy(audio)
+        if _is_audio_file(audio):
+            audio = load_audio(audio, dtype=np.int16, num_workers=decode_workers)
+        elif not isinstance(audio, np.ndarray):
+            blocks = _iter_mel_blocks(audio, n_mels, padding, device)
+            return _normalize_log_mel(torch.cat(list(blocks), dim=-1))
+        audio = _to_tensor(audio)
 
     if device is not None:
         audio = audio.to(device)
-    if padding > 0:
-        audio = F.pad(audio, (0, padding))
-    window = torch.hann_window(N_FFT).to(audio.device)
-    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
-    magnitudes = stft[..., :-1].abs() ** 2
 
+    # the STFT, power and Mel projection are computed block by block, each block taking its
+    # STFT context from the neighboring samples, and written into a preallocated output
+    length = audio.shape[-1] + padding
+    n_frames = length // HOP_LENGTH
     filters = mel_filters(audio.device, n_mels)
-    mel_spec = filters @ magnitudes
+    mel_spec = filters.new_empty(*audio.shape[:-1], n_mels, n_frames)
+
+    def compute_block(start: int):
+        end = min(start + MEL_BLOCK_FRAMES, n_frames)
+        mel_spec[..., start:end] = _mel_frames(audio, start, end, length, filters)
+
+    starts = range(0, n_frames, MEL_BLOCK_FRAMES)
+    if num_workers > 1 and len(starts) > 1 and audio.device.type == "cpu":
+        with ThreadPoolExecutor(num_workers) as executor:
+            list(executor.map(compute_block, starts))
+    else:
+        for start in starts:
+            compute_block(start)
+
+    return _normalize_log_mel(mel_spec)
+
 
+_mel_cache: Optional[DiskCache] = None
+
+
+def set_mel_cache(cache: Optional[DiskCache]):
+    """
+    Keep the log-Mel spectrograms computed by `log_mel_spectrogram` in the given cache, so that
+    later calls on the same audio memory-map them instead; None disables the cache. Entries
+    are keyed by a hash of the audio content, `n_mels` and `padding`; audio given as a file-like
+    object or as an iterable of chunks is not cached.
+    """
+    global _mel_cache
+    _mel_cache = cache
+
+
+def _mel_cache_key(audio, n_mels: int, padding: int) -> Optional[str]:
+    if _mel_cache is None or (content_hash := audio_sha256(audio)) is None:
+        return None
+    return DiskCache.key("mel", content_hash, n_mels, padding)
+
+
+def _normalize_log_mel(
+    mel_spec: torch.Tensor, log_spec_max: Optional[float] = None
+) -> torch.Tensor:
     log_spec = torch.clamp(mel_spec, min=1e-10).log10()
-    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+    if log_spec_max is None:
+        log_spec_max = log_spec.max()
+    else:
+        log_spec_max = torch.tensor(log_spec_max, dtype=log_spec.dtype)
+    log_spec = torch.maximum(log_spec, log_spec_max.to(log_spec.device) - 8.0)
     log_spec = (log_spec + 4.0) / 4.0
     return log_spec
+
+
+class LazyLogMelSpectrogram:
+    """
+    A log-Mel spectrogram whose frames are only computed when they are sliced, so that memory
+    use stays constant regardless of the audio duration. `mel[:, start:end]` gives the same
+    values as `log_mel_spectrogram(audio, n_mels, padding)[:, start:end]`: every slice is
+    computed from the samples it covers plus N_FFT // 2 samples of STFT context on each side.
+
+    `log_mel_spectrogram` clamps the spectrogram to 8 orders of magnitude below its global
+    maximum. To reproduce this, the constructor makes a first pass over the audio that only
+    keeps track of that maximum, unless it is given as `log_spec_max`, e.g. from a previous
+    run over the same audio (see the `log_spec_max` attribute).
+
+    An audio file is streamed with `stream_audio` rather than loaded into memory; it is then
+    decoded twice, once for the first pass and once while the windows are being sliced, which
+    is expected to happen mostly in increasing order. Decoding restarts with ffmpeg seeking
+    to the requested position whenever a slice is before or far after the decoded samples.
+    Audio given as bytes or a file-like object cannot be decoded twice, and is loaded upfront;
+    so are waveform chunks such as the ones from `stream_audio`, which can only be read once.
+    A (waveform or chunks, sample_rate) tuple is resampled upfront.
+
+    If `clips` are given as (start, end) frame ranges, with `end=None` meaning the end of the
+    audio, the first pass and the normalization only cover these ranges, and only the parts of
+    an audio file around them are decoded. Unless the last clip reaches the end of the file,
+    its length is not known; `shape` then only extends to the last decoded sample.
+    """
+
+    def __init__(
+        self,
+        audio: Union[
+            AudioFile,
+            np.ndarray,
+            torch.Tensor,
+            Iterable[np.ndarray],
+            Tuple[np.ndarray, int],
+        ],
+        n_mels: int = 80,
+        padding: int = 0,
+        device: Optional[Union[str, torch.device]] = None,
+        log_spec_max: Optional[float] = None,
+        clips: Optional[List[Tuple[int, Optional[int]]]] = None,
+    ):
+        if isinstance(audio, tuple):
+            audio = _resample_input(audio)
+        if isinstance(audio, os.PathLike):
+            audio = os.fspath(audio)
+        elif _is_audio_file(audio) and not isinstance(audio, str):
+            # audio in memory or from a file-like object is only decoded once, upfront
+            audio = load_audio(audio, dtype=np.int16)
+        elif not (isinstance(audio, (str, np.ndarray)) or torch.is_tensor(audio)):
+            audio = np.concatenate(list(audio))
+
+        if isinstance(audio, str):
+            self.file, self.audio = audio, None
+        else:
+            self.file, self.audio = None, _to_tensor(audio)
+            if device is not None:
+                self.audio = self.audio.to(device)
+
+        self.n_mels = n_mels
+        self.padding = padding
+        self.device = device
+
+        self._stream = None  # for audio files, an iterator over `stream_audio` chunks
+        self._buffer = None  # the streamed samples from `_offset` onwards
+        self._offset = 0
+        self._decoded_end = 0  # the furthest sample decoded so far
+
+        if self.audio is not None:
+            self.n_samples = self.audio.shape[-1]
+            batch_shape = tuple(self.audio.shape[:-1])
+        else:
+            self.n_samples = None  # known once the stream reaches the end of the file
+            batch_shape = ()
+
+        if log_spec_max is None or self.n_samples is None:
+            first_pass_max = self._first_pass(clips or [(0, None)])
+            if log_spec_max is None:
+                log_spec_max = first_pass_max
+        self.log_spec_max: float = log_spec_max
+
+        if self.n_samples is None:
+            # the clips did not reach the end of the file
+            self.n_samples = self._decoded_end
+
+        n_frames = (self.n_samples + padding) // HOP_LENGTH
+        self.shape = batch_shape + (n_mels, n_frames)
+
+    def _first_pass(self, clips: List[Tuple[int, Optional[int]]]) -> Optional[float]:
+        """Find the maximum log-Mel value in the clips, learning the audio length on the way"""
+        log_spec_max = None
+        for start, end in clips:
+            while end is None or start < end:
+                block_end = start + MEL_BLOCK_FRAMES
+                if end is not None:
+                    block_end = min(block_end, end)
+
+                mel_spec = self._mel_spec(start, block_end)
+                if mel_spec is not None:
+                    block_max = torch.clamp(mel_spec, min=1e-10).log10().max().item()
+                    if log_spec_max is None or block_max > log_spec_max:
+                        log_spec_max = block_max
+
+                start = block_end
+                if self.n_samples is not None:
+                    if start >= (self.n_samples + self.padding) // HOP_LENGTH:
+                        break
+
+        return log_spec_max
+
+    def _read(self, start: int, end: int) -> Tuple[torch.Tensor, int]:
+        """
+        Return a tensor containing the samples [start, end) of the audio, or up to its end,
+        and the index of the first sample it contains
+        """
+        if self.audio is not None:
+            return self.audio, 0
+
+        if (
+            self._stream is None
+            or start < self._offset
+            or start > self._offset + self._buffer.shape[-1] + N_SAMPLES
+        ):
+            # (re)start decoding DECODE_SEGMENT_OVERLAP seconds before the 10-ms boundary right
+            # before `start`, as in `_decode_segment`, so that the decoder and resampler have
+            # settled by then; the samples before `start` are discarded below
+            if self._stream is not None:
+                self._stream.close()
+            self._offset = start // HOP_LENGTH * HOP_LENGTH
+            self._offset -= min(
+                round(DECODE_SEGMENT_OVERLAP * SAMPLE_RATE), self._offset
+            )
+            self._stream = stream_audio(
+                self.file, dtype=np.int16, start=self._offset / SAMPLE_RATE
+            )
+            self._buffer = torch.zeros(0, dtype=torch.int16, device=self.device)
+
+        while True:
+            discard = min(start - self._offset, self._buffer.shape[-1])
+            if discard > 0:
+                self._buffer = self._buffer[..., discard:]
+                self._offset += discard
+            if self._offset + self._buffer.shape[-1] >= end:
+                break
+            try:
+                chunk = torch.from_numpy(next(self._stream))
+            except StopIteration:
+                if self.n_samples is None:
+                    self.n_samples = self._offset + self._buffer.shape[-1]
+                break
+            chunk = chunk.to(self._buffer.device)
+            self._buffer = torch.cat([self._buffer, chunk], dim=-1)
+
+        buffer_end = self._offset + self._buffer.shape[-1]
+        self._decoded_end = max(self._decoded_end, buffer_end)
+        return self._buffer, self._offset
+
+    def _mel_spec(self, start: int, end: int) -> Optional[torch.Tensor]:
+        """The Mel power spectrum of the frames [start, end), clipped to the audio length"""
+        audio, offset = self._read(
+            max(start * HOP_LENGTH - N_FFT // 2, 0),
+            (end - 1) * HOP_LENGTH + N_FFT // 2,
+        )
+        if self.n_samples is not None:
+            end = min(end, (self.n_samples + self.padding) // HOP_LENGTH)
+            length = self.n_samples + self.padding
+        else:
+            length = offset + audio.shape[-1] + self.padding  # the length read so far
+        if end <= start:
+            return None
+
+        filters = mel_filters(audio.device, self.n_mels)
+        return _mel_frames(audio, start, end, length, filters, offset)
+
+    def __getitem__(self, index) -> torch.Tensor:
+        *leading, frames = index if isinstance(index, tuple) else (index,)
+        if (
+            len(leading) != len(self.shape) - 1
+            or any(i != slice(None) for i in leading)
+            or not isinstance(frames, slice)
+        ):
+            raise IndexError("Only slicing along the last (frame) axis is supported")
+        start, end, step = frames.indices(self.shape[-1])
+        if step != 1:
+            raise IndexError("Slicing with a step is not supported")
+
+        mel_spec = self._mel_spec(start, end)
+        if mel_spec is None:
+            device = self.audio.device if self.audio is not None else self.device
+            return torch.zeros(*self.shape[:-1], 0, device=device)
+        return _normalize_log_mel(mel_spec, self.log_spec_max)
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+import numpy as np
+import torch
+
+if TYPE_CHECKING:
+    from .model import Whisper
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """The SHA256 hex digest of the contents of a file, read one chunk at a time"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _file_identity(stat: os.stat_result) -> dict:
+    return dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+
+
+def record_file_sha256(path: str, sha256: str):
+    """
+    Record the SHA256 of a file in a "<path>.sha256" sidecar along with the file's size,
+    modification time and inode, for `verified_file_sha256` to trust until the file changes
+    """
+    sidecar = dict(_file_identity(os.stat(path)), sha256=sha256)
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(sidecar, f)
+        os.replace(temp_path, path + ".sha256")
+    except OSError:
+        pass  # e.g. a read-only directory; the file is hashed again next time
+
+
+def verified_file_sha256(path: str) -> str:
+    """
+    The SHA256 of a file, read from its "<path>.sha256" sidecar if the file's size, modification
+    time and inode are the same as when it was recorded, or else computed by reading the file
+    one chunk at a time, and recorded
+    """
+    identity = _file_identity(os.stat(path))
+    try:
+        with open(path + ".sha256") as f:
+            sidecar = json.load(f)
+        if {key: sidecar.get(key) for key in identity} == identity:
+            return sidecar["sha256"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass  # a missing or unreadable sidecar
+
+    sha256 = file_sha256(path)
+    record_file_sha256(path, sha256)
+    return sha256
+
+
+_model_hashes = weakref.WeakKeyDictionary()
+
+
+def model_sha256(model: "Whisper") -> str:
+    """
+    The SHA256 of the checkpoint the model was loaded from, if known,
+    or else of its parameters, which is computed once per model
+    """
+    if model.checkpoint_sha256 is not None:
+        return model.checkpoint_sha256
+    if model not in _model_hashes:
+        sha256 = hashlib.sha256()
+        for name, tensor in sorted(model.state_dict().items()):
+            if not torch.is_tensor(tensor) or tensor.is_quantized:
+                continue  # the packed weights of a quantized model
+            data = tensor.detach().cpu().contiguous().view(-1).view(torch.uint8)
+            sha256.update(name.encode())
+            sha256.update(data.numpy().data)
+        _model_hashes[model] = sha256.hexdigest()
+    return _model_hashes[model]
+
+
+def model_dtype(model: "Whisper") -> Union[torch.dtype, str]:
+    """The dtype of the model weights, along with the quantization of the model, if any"""
+    dtype = next(model.parameters()).dtype
+    return dtype if model.quantization is None else f"{dtype}+{model.quantization}"
+
+
+def audio_sha256(audio) -> Optional[str]:
+    """A hash of the audio file contents or of the waveform, or None if it cannot be read twice"""
+    if isinstance(audio, (str, os.PathLike)):
+        try:
+            return file_sha256(audio)
+        except OSError:
+            return None  # let ffmpeg report the error
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(audio).hexdigest()
+    if isinstance(audio, tuple):
+        waveform, sample_rate = audio
+        waveform_hash = audio_sha256(waveform)
+        return waveform_hash and f"{waveform_hash}@{sample_rate}"
+    if isinstance(audio, np.ndarray) or torch.is_tensor(audio):
+        array = audio.cpu().numpy() if torch.is_tensor(audio) else audio
+        sha256 = hashlib.sha256(f"{array.dtype}{array.shape}".encode())
+        sha256.update(np.ascontiguousarray(array).data)
+        return sha256.hexdigest()
+    return None
+
+
+def default_cache_dir() -> str:
+    """The directory for whisper's caches, "~/.cache/whisper" unless XDG_CACHE_HOME is set"""
+    default = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+
+
+class DiskCache:
+    """
+    A directory of NumPy arrays stored as .npy files, which are memory-mapped when read.
+
+    Entries are written to a temporary file that is then renamed, so that concurrent readers
+    and writers, possibly in other processes, never see a partial entry. Reading an entry
+    updates its modification time, and once the entries exceed `max_bytes` in total, the least
+    recently used ones are deleted.
+    """
+
+    suffix = ".npy"
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Make an entry name from the string representation of the given values"""
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the memory-mapped array stored under the key, or None if there is none"""
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+            os.utime(path)  # mark the entry as recently used
+        except (FileNotFoundError, ValueError):
+            return None  # a missing, evicted or unreadable entry
+        return array
+
+    def put(self, key: str, array: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Store the array under the key, evicting the least recently used entries as necessary,
+        and return it memory-mapped from the cache; the array is not stored, and None is
+        returned, if it is larger than `max_bytes` on its own
+        """
+        if self.max_bytes is not None and array.nbytes > self.max_bytes:
+            return None
+        self._write(key, lambda f: np.save(f, array))
+        return self.get(key)
+
+    def _write(self, key: str, write: Callable):
+        """Atomically replace the entry with what `write` writes to a binary file"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None):
+        """Delete the least recently used entries until they fit within `max_bytes`"""
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # deleted by another process
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self._path(keep):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class MemoryCache:
+    """
+    An in-memory mapping of keys to tensors or arrays, which evicts the least recently used
+    entries once their total size exceeds `max_bytes`; it can be shared between threads.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Union[torch.Tensor, np.ndarray]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Union[torch.Tensor, np.ndarray]):
+        if value.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = value
+            self._nbytes += value.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+
+class EncoderCache:
+    """
+    A cache of the audio encoder outputs, keyed by a hash of the Mel spectrogram window and of
+    the model, so that windows that come back, e.g. when transcribing the same audio again or in
+    silent or repeated parts, are not encoded again. Set it as `model.encoder_cache` to have
+    `Whisper.embed_audio` check it for each window, as `DecodingTask` and `transcribe` do.
+
+    The outputs are kept on the model's device in an LRU cache of `max_bytes`, and optionally
+    in a `DiskCache` as well, from which they are read when they have been evicted from memory
+    or computed by another process.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30, disk: Optional[DiskCache] = None):
+        self.memory = MemoryCache(max_bytes)
+        self.disk = disk
+
+    def key(self, model: "Whisper", mel: torch.Tensor) -> str:
+        """The cache key of the encoder output for a single Mel spectrogram window"""
+        sha256 = hashlib.sha256(model_sha256(model).encode())
+        sha256.update(f"{model_dtype(model)}{mel.dtype}{tuple(mel.shape)}".encode())
+        mel = mel.detach().cpu().contiguous().view(-1).view(torch.uint8)
+        sha256.update(mel.numpy().data)
+        return sha256.hexdigest()
+
+    def get(self, key: str, device: torch.device) -> Optional[torch.Tensor]:
+        features = self.memory.get(key)
+        if features is None and self.disk is not None:
+            array = self.disk.get(key)
+            if array is not None:
+                features = torch.from_numpy(np.array(array)).to(device)
+                self.memory.put(key, features)
+        return features
+
+    def put(self, key: str, features: torch.Tensor):
+        features = features.clone()  # do not keep the rest of the batch alive
+        self.memory.put(key, features)
+        if self.disk is not None and features.dtype in (torch.float16, torch.float32):
+            self.disk.put(key, features.cpu().numpy())
+
+    def embed_audio(self, model: "Whisper", mel: torch.Tensor) -> torch.Tensor:
+        """Encode a batch of Mel spectrogram windows, only running the encoder on cache misses"""
+        keys = [self.key(model, window) for window in mel]
+        found = {key: self.get(key, mel.device) for key in keys}
+        missing = {}  # identical windows in the batch are only encoded once
+        for i, key in enumerate(keys):
+            if found[key] is None:
+                missing.setdefault(key, i)
+        if missing:
+            encoded = model.encoder(mel[list(missing.values())])
+            for key, output in zip(missing, encoded):
+                self.put(key, output)
+                found[key] = output
+        return torch.stack([found[key].to(mel.device) for key in keys])
+
+
+class TranscriptCache(DiskCache):
+    """
+    A directory of `transcribe` results stored as JSON, keyed by the audio contents, the model
+    and the transcription options, so that transcribing the same audio again with the same
+    model and options returns the stored result without running the model. Like `DiskCache`,
+    whose atomic writes and LRU eviction it shares, it can be used by several processes at once.
+    """
+
+    suffix = ".json"
+
+    @staticmethod
+    def transcript_key(model: "Whisper", audio, options: dict) -> Optional[str]:
+        """
+        The cache key of the transcription of the audio by the model with the given options,
+        or None if the audio is read from a stream, which cannot be hashed beforehand
+        """
+        if (content_hash := audio_sha256(audio)) is None:
+            return None
+        # nested options such as `decode_options` are sorted too, whatever their keyword order
+        options = json.dumps(options, sort_keys=True, default=repr)
+        return DiskCache.key(
+            "transcript", content_hash, model_sha256(model), model_dtype(model), options
+        )
+
+    def get(self, key: str) -> Optional[Union[dict, list]]:
+        """Return the result stored under the key, or None if there is none"""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)  # mark the entry as recently used
+        except (FileNotFoundError, ValueError):
+            return None  # a missing, evicted or unreadable entry
+        return result
+
+    def put(self, key: str, result: Union[dict, list]):
+        """Store the result under the key, unless it is larger than `max_bytes` on its own"""
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        self._write(key, lambda f: f.write(data))
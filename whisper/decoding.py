@@ -12,7 +12,7 @@ from .tokenizer import Tokenizer, get_tokenizer
 from .utils import compression_ratio
 
 if TYPE_CHECKING:
-    from .model import Whisper
+    from .model import KVCache, Whisper
 
 
 @torch.no_grad()
@@ -145,16 +145,18 @@ class PyTorchInference(Inference):
     def __init__(self, model: "Whisper", initial_token_length: int):
         self.model: "Whisper" = model
         self.initial_token_length = initial_token_length
-        self.kv_cache = {}
-        self.hooks = []
-
-        key_modules = [block.attn.key for block in self.model.decoder.blocks]
-        value_modules = [block.attn.value for block in self.model.decoder.blocks]
-        self.kv_modules = key_modules + value_modules
+        self.kv_cache: Optional["KVCache"] = None
 
     def logits(self, tokens: Tensor, audio_features: Tensor) -> Tensor:
-        if not self.kv_cache:
-            self.kv_cache, self.hooks = self.model.install_kv_cache_hooks()
+        if self.kv_cache is None:
+            from .model import KVCache  # not at the top, which would be circular
+
+            self.kv_cache = KVCache(
+                self.model.decoder,
+                n_batch=tokens.shape[0],
+                dtype=audio_features.dtype,
+                device=audio_features.device,
+            )
 
         if tokens.shape[-1] > self.initial_token_length:
             # only need to use the last token except in the first forward pass
@@ -163,17 +165,11 @@ class PyTorchInference(Inference):
         return self.model.decoder(tokens, audio_features, kv_cache=self.kv_cache)
 
     def cleanup_caching(self):
-        for hook in self.hooks:
-            hook.remove()
-
-        self.kv_cache = {}
-        self.hooks = []
+        self.kv_cache = None
 
     def rearrange_kv_cache(self, source_indices):
-        if source_indices != list(range(len(source_indices))):
-            for module in self.kv_modules:
-                # update the key/value cache to contain the selected sequences
-                self.kv_cache[module] = self.kv_cache[module][source_indices].detach()
+        # update the key/value cache to contain the selected sequences
+        self.kv_cache.reorder(source_indices)
 
 
 class SequenceRanker:
@@ -642,8 +638,11 @@ class DecodingTask:
         return tuple(sorted(set(suppress_tokens)))
 
     def _get_audio_features(self, mel: Tensor):
-        if self.options.fp16:
-            mel = mel.half()
+        dtype = self.model.compute_dtype
+        if dtype is None:
+            dtype = torch.float16 if self.options.fp16 else torch.float32
+        if self.options.fp16 or self.model.compute_dtype is not None:
+            mel = mel.to(dtype)
 
         if mel.shape[-2:] == (
             self.model.dims.n_audio_ctx,
@@ -652,11 +651,9 @@ class DecodingTask:
             # encoded audio features are given; skip audio encoding
             audio_features = mel
         else:
-            audio_features = self.model.encoder(mel)
+            audio_features = self.model.embed_audio(mel)
 
-        if audio_features.dtype != (
-            torch.float16 if self.options.fp16 else torch.float32
-        ):
+        if audio_features.dtype != dtype:
             return TypeError(
                 f"audio_features has an incorrect dtype: {audio_features.dtype}"
             )
@@ -737,7 +734,6 @@ class DecodingTask:
         tokens, sum_logprobs, no_speech_probs = self._main_loop(audio_features, tokens)
 
         # reshape the tensors to have (n_audio, n_group) as the first two dimensions
-        audio_features = audio_features[:: self.n_group]
         no_speech_probs = no_speech_probs[:: self.n_group]
         assert audio_features.shape[0] == len(no_speech_probs) == n_audio
 
@@ -0,0 +1,247 @@
+import difflib
+import hashlib
+import itertools
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+from .audio import (
+    FRAMES_PER_SECOND,
+    SAMPLE_RATE,
+    _is_audio_file,
+    _resample_input,
+    load_audio,
+)
+
+# content-defined chunks of the PCM samples are cut where a hash of the preceding samples
+# has its top bits set to zero, so that the chunks of unchanged audio are the same wherever
+# it moves to after an edit; the chunks are 0.5 seconds long on average, and 8 at most
+CHUNK_MASK = (1 << 13) - 1
+MIN_CHUNK_SIZE = SAMPLE_RATE // 8
+MAX_CHUNK_SIZE = SAMPLE_RATE * 8
+BOUNDARY_WIDTH = 4
+
+# the previous decoding of a window is only reused if the window and its neighbours are in a
+# region of unchanged audio, which must be at least this long (in seconds)
+MIN_UNCHANGED_DURATION = 1.0
+
+
+def load_waveform(audio) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Load any of the audio inputs accepted by `transcribe` as a single waveform at 16 kHz,
+    decoding audio files to 16-bit PCM
+    """
+    if isinstance(audio, tuple):
+        audio = _resample_input(audio)
+    if _is_audio_file(audio):
+        return load_audio(audio, dtype=np.int16)
+    if isinstance(audio, np.ndarray) or torch.is_tensor(audio):
+        return audio
+    return np.concatenate(list(audio))
+
+
+def pcm16(audio: Union[np.ndarray, torch.Tensor]) -> np.ndarray:
+    """The waveform as 16-bit PCM samples, as decoded by ffmpeg in `load_audio`"""
+    if torch.is_tensor(audio):
+        audio = audio.cpu().numpy()
+    if audio.dtype == np.int16:
+        return audio
+    return np.clip(np.round(audio * 32768), -32768, 32767).astype(np.int16)
+
+
+def audio_fingerprints(audio: np.ndarray) -> List[Tuple[str, int]]:
+    """
+    Split the 16-bit PCM audio into content-defined chunks and return the (hash, length) of
+    each, so that the chunks of audio that is unchanged by trimming or splicing a recording
+    are found with `match_fingerprints`, even if they are shifted by any number of samples
+
+    Parameters
+    ----------
+    audio: np.ndarray
+        The waveform as 16-bit PCM samples, e.g. from `load_audio(..., dtype=np.int16)`
+
+    Returns
+    -------
+    A list of (hash, length) pairs, in samples, of the consecutive chunks of the audio
+    """
+    candidates = np.concatenate(
+        [
+            block_start
+            + _boundary_candidates(audio[block_start - BOUNDARY_WIDTH : block_end])
+            for block_start, block_end in _blocks(len(audio))
+        ]
+        or [np.zeros(0, dtype=np.int64)]  # no blocks in audio this short
+    )
+
+    boundaries = [0]
+    while boundaries[-1] < len(audio):
+        start = boundaries[-1]
+        index = np.searchsorted(candidates, start + MIN_CHUNK_SIZE)
+        end = candidates[index] if index < len(candidates) else len(audio)
+        boundaries.append(int(min(end, start + MAX_CHUNK_SIZE, len(audio))))
+
+    return [
+        (
+            hashlib.blake2b(audio[start:end].tobytes(), digest_size=8).hexdigest(),
+            end - start,
+        )
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def _blocks(n_samples: int, block_size: int = 1 << 20):
+    for block_start in range(BOUNDARY_WIDTH, n_samples, block_size):
+        yield block_start, min(block_start + block_size, n_samples)
+
+
+def _boundary_candidates(samples: np.ndarray) -> np.ndarray:
+    """
+    The positions after the first `BOUNDARY_WIDTH` samples where a hash of the `BOUNDARY_WIDTH`
+    preceding samples is zero in its top bits, relative to the first of those positions
+    """
+    n = len(samples) - BOUNDARY_WIDTH
+    samples = samples.astype(np.int64).view(np.uint64)
+    mixed = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(BOUNDARY_WIDTH):
+            # multiply by odd constants and xor-shift, wrapping around 64 bits
+            window = samples[BOUNDARY_WIDTH - 1 - k : BOUNDARY_WIDTH - 1 - k + n]
+            mixed ^= window * np.uint64(0x9E3779B97F4A7C15 - 2 * k)
+            mixed *= np.uint64(0xBF58476D1CE4E5B9)
+            mixed ^= mixed >> np.uint64(31)
+    is_boundary = (mixed >> np.uint64(64 - CHUNK_MASK.bit_length())) == 0
+    return np.flatnonzero(is_boundary)
+
+
+def match_fingerprints(
+    previous: List[Tuple[str, int]], current: List[Tuple[str, int]]
+) -> List[Tuple[int, int, int]]:
+    """
+    Find the audio that is unchanged between two versions of a recording from their fingerprints
+
+    Returns
+    -------
+    A list of (previous_start, current_start, length) triples, in samples, of the regions of
+    the audio that are identical in both versions
+    """
+    previous_offsets = [0, *itertools.accumulate(length for _, length in previous)]
+    current_offsets = [0, *itertools.accumulate(length for _, length in current)]
+    matcher = difflib.SequenceMatcher(
+        None, [h for h, _ in previous], [h for h, _ in current], autojunk=False
+    )
+    return [
+        (
+            previous_offsets[i],
+            current_offsets[j],
+            previous_offsets[i + size] - previous_offsets[i],
+        )
+        for i, j, size in matcher.get_matching_blocks()
+        if size > 0
+    ]
+
+
+def reusable_segments(
+    previous_result: dict, regions: List[Tuple[int, int, int]], duration: float
+) -> Tuple[List[dict], List[float]]:
+    """
+    Find the windows of a previous transcription that can be reused for the current audio: the
+    windows that lie in a region of unchanged audio, and whose neighbouring windows do as well,
+    as the text of a window depends on the audio that follows it and on the prompt before it.
+
+    Parameters
+    ----------
+    previous_result: dict
+        The result of `transcribe` for the previous version of the audio, with its "fingerprints"
+
+    regions: List[Tuple[int, int, int]]
+        The regions of unchanged audio, as returned by `match_fingerprints`
+
+    duration: float
+        The duration of the current audio, in seconds
+
+    Returns
+    -------
+    The segments of the reusable windows, shifted to the timeline of the current audio, and the
+    start,end,start,end,... timestamps of the clips of the current audio to decode again
+    """
+    previous_duration = sum(length for _, length in previous_result["fingerprints"])
+    previous_duration /= SAMPLE_RATE
+    regions = [
+        (a / SAMPLE_RATE, b / SAMPLE_RATE, n / SAMPLE_RATE)
+        for a, b, n in regions
+        if n / SAMPLE_RATE >= MIN_UNCHANGED_DURATION
+    ]
+
+    # a window spans the audio from its seek to the next window's seek
+    windows = [
+        list(segments)
+        for _, segments in itertools.groupby(
+            previous_result["segments"], key=lambda s: s["seek"]
+        )
+    ]
+    starts = [segments[0]["seek"] / FRAMES_PER_SECOND for segments in windows]
+    ends = (
+        starts[1:] + [max(previous_duration, windows[-1][-1]["end"])] if windows else []
+    )
+
+    def region_of(start: float, end: float) -> Optional[int]:
+        for index, (previous_start, _, length) in enumerate(regions):
+            if previous_start <= start and end <= previous_start + length:
+                return index
+        return None
+
+    window_regions = [region_of(start, end) for start, end in zip(starts, ends)]
+    if window_regions and window_regions[-1] is not None:
+        # the last window was decoded up to the end of the audio, which must not have moved
+        previous_start, current_start, length = regions[window_regions[-1]]
+        if abs(current_start + length - duration) > 1 / SAMPLE_RATE:
+            window_regions[-1] = None
+    reused_spans = []  # (start, end, region) in the previous timeline
+    for i, region in enumerate(window_regions):
+        neighbours = window_regions[max(i - 1, 0) : i + 2]
+        if region is None or any(r != region for r in neighbours):
+            continue
+        if (
+            reused_spans
+            and reused_spans[-1][2] == region
+            and reused_spans[-1][1] == starts[i]
+        ):
+            reused_spans[-1] = (reused_spans[-1][0], ends[i], region)
+        else:
+            reused_spans.append((starts[i], ends[i], region))
+
+    segments = []
+    clip_timestamps = []
+    decoded_until = 0.0
+    for start, end, region in reused_spans:
+        previous_start, current_start, _ = regions[region]
+        shift = current_start - previous_start
+        for window, window_start in zip(windows, starts):
+            if start <= window_start < end:
+                segments.extend(shift_segment(segment, shift) for segment in window)
+        if start + shift > decoded_until:
+            clip_timestamps.extend([decoded_until, start + shift])
+        decoded_until = end + shift
+    if decoded_until < duration:
+        clip_timestamps.extend([decoded_until, duration])
+
+    return segments, clip_timestamps
+
+
+def shift_segment(segment: dict, shift: float) -> dict:
+    """A copy of the segment with its timestamps moved by `shift` seconds"""
+    segment = dict(segment)
+    segment["seek"] = round(segment["seek"] + shift * FRAMES_PER_SECOND)
+    segment["start"] = round(segment["start"] + shift, 3)
+    segment["end"] = round(segment["end"] + shift, 3)
+    if "words" in segment:
+        segment["words"] = [
+            dict(
+                word,
+                start=round(word["start"] + shift, 3),
+                end=round(word["end"] + shift, 3),
+            )
+            for word in segment["words"]
+        ]
+    return segment
@@ -2,13 +2,14 @@ import base64
 import gzip
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torch.nn.functional as F
 from torch import Tensor, nn
 
+from .cache import EncoderCache
 from .decoding import decode as decode_function
 from .decoding import detect_language as detect_language_function
 from .transcribe import transcribe as transcribe_function
@@ -38,7 +39,13 @@ class ModelDimensions:
 
 class LayerNorm(nn.LayerNorm):
     def forward(self, x: Tensor) -> Tensor:
-        return super().forward(x.float()).type(x.dtype)
+        return F.layer_norm(
+            x.float(),
+            self.normalized_shape,
+            None if self.weight is None else self.weight.float(),
+            None if self.bias is None else self.bias.float(),
+            self.eps,
+        ).type(x.dtype)
 
 
 class Linear(nn.Linear):
@@ -50,6 +57,28 @@ class Linear(nn.Linear):
         )
 
 
+def quantize_linear(weight: Tensor, bias: Optional[Tensor]) -> nn.Module:
+    """
+    A dynamically quantized linear layer with the given weight and bias, for CPU inference: the
+    weight is stored in int8 with a scale for each output channel, and the float32 inputs are
+    quantized on the fly
+    """
+    import torch.ao.nn.quantized.dynamic as nnqd
+
+    weight = weight.detach().float()
+    scales = weight.abs().amax(dim=1).clamp(min=1e-8) / 127
+    zero_points = torch.zeros(len(scales), dtype=torch.long)
+    qweight = torch.quantize_per_channel(
+        weight, scales.double(), zero_points, axis=0, dtype=torch.qint8
+    )
+    out_features, in_features = weight.shape
+    qlinear = nnqd.Linear(
+        in_features, out_features, bias_=bias is not None, dtype=torch.qint8
+    )
+    qlinear.set_weight_bias(qweight, None if bias is None else bias.detach().float())
+    return qlinear
+
+
 class Conv1d(nn.Conv1d):
     def _conv_forward(
         self, x: Tensor, weight: Tensor, bias: Optional[Tensor]
@@ -88,17 +117,69 @@ class MultiHeadAttention(nn.Module):
         self.key = Linear(n_state, n_state, bias=False)
         self.value = Linear(n_state, n_state)
         self.out = Linear(n_state, n_state)
+        # set by `fuse_qkv`, not saved in the state dict
+        self.register_buffer("qkv_weight", None, persistent=False)
+        self.register_buffer("qkv_bias", None, persistent=False)
+
+    def fuse_qkv(self):
+        """
+        Concatenate the query, key and value projections into `qkv_weight` and `qkv_bias`, so that
+        self-attention computes them with a single matrix multiplication; the weights of the three
+        projections become views of the fused ones, which are therefore not stored twice, and the
+        state dict is unchanged
+        """
+        weight = torch.cat([self.query.weight, self.key.weight, self.value.weight])
+        bias = torch.cat(
+            [self.query.bias, torch.zeros_like(self.value.bias), self.value.bias]
+        )
+        self.qkv_weight = weight.detach()
+        self.qkv_bias = bias.detach()
+        self._share_qkv()
+
+    def _share_qkv(self):
+        n_state = self.query.weight.shape[0]
+        self.query.weight.data = self.qkv_weight[:n_state]
+        self.key.weight.data = self.qkv_weight[n_state : 2 * n_state]
+        self.value.weight.data = self.qkv_weight[2 * n_state :]
+        self.query.bias.data = self.qkv_bias[:n_state]
+        self.value.bias.data = self.qkv_bias[2 * n_state :]
+
+    def _apply(self, fn, *args, **kwargs):
+        super()._apply(fn, *args, **kwargs)
+        if self.qkv_weight is not None:
+            # e.g. `.to(dtype)` converts the projections and the fused weights separately
+            self._share_qkv()
+        return self
 
     def forward(
         self,
         x: Tensor,
         xa: Optional[Tensor] = None,
         mask: Optional[Tensor] = None,
-        kv_cache: Optional[dict] = None,
+        kv_cache: Optional[Union[dict, "KVCache"]] = None,
     ):
+        if (
+            self.qkv_weight is not None
+            and xa is None
+            and not isinstance(kv_cache, dict)
+        ):
+            # the hooks of `install_kv_cache_hooks` need the separate key and value projections
+            qkv = F.linear(x, self.qkv_weight.to(x.dtype), self.qkv_bias.to(x.dtype))
+            q, k, v = qkv.chunk(3, dim=-1)
+            if isinstance(kv_cache, KVCache):
+                k, v = kv_cache.self_attention(self, k, v)
+            wv, qk = self.qkv_attention(q, k, v, mask)
+            return self.out(wv), qk
+
         q = self.query(x)
 
-        if kv_cache is None or xa is None or self.key not in kv_cache:
+        if isinstance(kv_cache, KVCache):
+            if xa is not None:
+                return self.grouped_cross_attention(
+                    q, *kv_cache.cross_attention(self, xa)
+                )
+            k, v = kv_cache.self_attention(self, self.key(x), self.value(x))
+        elif kv_cache is None or xa is None or self.key not in kv_cache:
             # hooks, if installed (i.e. kv_cache is not None), will prepend the cached kv tensors;
             # otherwise, perform key/value projections for self- or cross-attention as usual.
             k = self.key(x if xa is None else xa)
@@ -111,6 +192,21 @@ class MultiHeadAttention(nn.Module):
         wv, qk = self.qkv_attention(q, k, v, mask)
         return self.out(wv), qk
 
+    def grouped_cross_attention(
+        self, q: Tensor, k: Tensor, v: Tensor
+    ) -> Tuple[Tensor, Optional[Tensor]]:
+        """
+        Attend from the consecutive groups of `q.shape[0] // k.shape[0]` rows of the queries, e.g.
+        the beams of each audio, to the keys and values of their audio, which are stored once
+        """
+        n_batch, n_ctx, n_state = q.shape
+        n_audio = k.shape[0]
+        wv, qk = self.qkv_attention(q.reshape(n_audio, -1, n_state), k, v)
+        if qk is not None:
+            qk = qk.unflatten(2, (n_batch // n_audio, n_ctx)).transpose(1, 2)
+            qk = qk.reshape(n_batch, *qk.shape[2:])
+        return self.out(wv.reshape(q.shape)), qk
+
     def qkv_attention(
         self, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor] = None
     ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
@@ -139,6 +235,77 @@ class MultiHeadAttention(nn.Module):
         return out, qk
 
 
+class KVCache:
+    """
+    The keys and values of the attention layers of a `TextDecoder` for the tokens decoded so far,
+    which are passed as `kv_cache` to its forward pass to only process the new tokens.
+
+    The self-attention keys and values are written in place into buffers preallocated for all
+    `n_text_ctx` positions, of shape (n_batch, n_text_ctx, n_text_state) for each layer, and
+    `length` positions of which are filled. The cross-attention keys and values are computed
+    from the audio features in the first forward pass, and reused in the following ones; they
+    are stored once per audio, and shared by the consecutive rows decoded from the same audio,
+    e.g. the beams of beam search, when the audio features are not repeated for each row.
+    """
+
+    def __init__(
+        self,
+        decoder: "TextDecoder",
+        n_batch: int,
+        dtype: torch.dtype,
+        device: torch.device,
+    ):
+        n_ctx, n_state = decoder.positional_embedding.shape
+        self.layers: Dict[nn.Module, int] = {}
+        for i, block in enumerate(decoder.blocks):
+            self.layers[block.attn] = i
+            self.layers[block.cross_attn] = i
+
+        def empty():
+            return torch.empty(n_batch, n_ctx, n_state, dtype=dtype, device=device)
+
+        self.keys = [empty() for _ in decoder.blocks]
+        self.values = [empty() for _ in decoder.blocks]
+        self.cross_keys: List[Optional[Tensor]] = [None] * len(decoder.blocks)
+        self.cross_values: List[Optional[Tensor]] = [None] * len(decoder.blocks)
+        self.length = 0
+
+    def self_attention(
+        self, module: "MultiHeadAttention", k: Tensor, v: Tensor
+    ) -> Tuple[Tensor, Tensor]:
+        """Store the keys and values of the new tokens, and return those of all the tokens"""
+        i = self.layers[module]
+        end = self.length + k.shape[1]
+        self.keys[i][:, self.length : end] = k
+        self.values[i][:, self.length : end] = v
+        return self.keys[i][:, :end], self.values[i][:, :end]
+
+    def cross_attention(
+        self, module: "MultiHeadAttention", xa: Tensor
+    ) -> Tuple[Tensor, Tensor]:
+        """The keys and values of the audio features, which are computed once"""
+        i = self.layers[module]
+        if self.cross_keys[i] is None:
+            self.cross_keys[i] = module.key(xa)
+            self.cross_values[i] = module.value(xa)
+        return self.cross_keys[i], self.cross_values[i]
+
+    def reorder(self, source_indices: List[int]):
+        """
+        Replace each row of the self-attention cache by the row at its source index, e.g. for
+        beam search, which only reorders the rows decoded from the same audio; only the rows
+        whose source is another row are copied, and nothing is if there are none
+        """
+        changed = [i for i, source in enumerate(source_indices) if source != i]
+        if not changed:
+            return
+        rows = torch.tensor(changed, device=self.keys[0].device)
+        sources = torch.tensor([source_indices[i] for i in changed], device=rows.device)
+        for buffer in self.keys + self.values:
+            # the source rows are gathered first, as they may be overwritten themselves
+            buffer[rows, : self.length] = buffer[sources, : self.length]
+
+
 class ResidualAttentionBlock(nn.Module):
     def __init__(self, n_state: int, n_head: int, cross_attention: bool = False):
         super().__init__()
@@ -162,7 +329,7 @@ class ResidualAttentionBlock(nn.Module):
         x: Tensor,
         xa: Optional[Tensor] = None,
         mask: Optional[Tensor] = None,
-        kv_cache: Optional[dict] = None,
+        kv_cache: Optional[Union[dict, "KVCache"]] = None,
     ):
         x = x + self.attn(self.attn_ln(x), mask=mask, kv_cache=kv_cache)[0]
         if self.cross_attn:
@@ -204,6 +371,20 @@ class AudioEncoder(nn.Module):
         return x
 
 
+def causal_mask(n_ctx: int) -> Tensor:
+    """The attention mask that stops each position from attending to the following ones"""
+    return torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
+
+
+def default_alignment_heads(dims: ModelDimensions) -> Tensor:
+    """The last half of the decoder layers, as a sparse (n_text_layer, n_text_head) mask"""
+    shape = (dims.n_text_layer, dims.n_text_head)
+    # not on the meta device
+    all_heads = torch.zeros(shape, dtype=torch.bool, device="cpu")
+    all_heads[dims.n_text_layer // 2 :] = True
+    return all_heads.to_sparse()
+
+
 class TextDecoder(nn.Module):
     def __init__(
         self, n_vocab: int, n_ctx: int, n_state: int, n_head: int, n_layer: int
@@ -220,28 +401,47 @@ class TextDecoder(nn.Module):
             ]
         )
         self.ln = LayerNorm(n_state)
+        # set by `Whisper.quantize`, to project the outputs on the token embeddings
+        self.logits_projection: Optional[nn.Module] = None
 
-        mask = torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
-        self.register_buffer("mask", mask, persistent=False)
+        self.register_buffer("mask", causal_mask(n_ctx), persistent=False)
 
-    def forward(self, x: Tensor, xa: Tensor, kv_cache: Optional[dict] = None):
+    def forward(
+        self,
+        x: Tensor,
+        xa: Tensor,
+        kv_cache: Optional[Union[dict, "KVCache"]] = None,
+    ):
         """
         x : torch.LongTensor, shape = (batch_size, <= n_ctx)
             the text tokens
         xa : torch.Tensor, shape = (batch_size, n_audio_ctx, n_audio_state)
-            the encoded audio features to be attended on
+            the encoded audio features to be attended on; with a `KVCache`, they can also be
+            given once per audio, for consecutive groups of rows of `x` decoded from each audio
+        kv_cache : Union[dict, KVCache]
+            the keys and values of the previous tokens, to which those of `x` are added:
+            a `KVCache`, or the dictionary filled by hooks from `Whisper.install_kv_cache_hooks`
         """
-        offset = next(iter(kv_cache.values())).shape[1] if kv_cache else 0
+        if isinstance(kv_cache, KVCache):
+            offset = kv_cache.length
+        else:
+            offset = next(iter(kv_cache.values())).shape[1] if kv_cache else 0
+        # add the embeddings in the wider of the weight and activation dtypes, and cast once
+        dtype = torch.promote_types(self.token_embedding.weight.dtype, xa.dtype)
         x = (
-            self.token_embedding(x)
-            + self.positional_embedding[offset : offset + x.shape[-1]]
-        )
-        x = x.to(xa.dtype)
+            self.token_embedding(x).to(dtype)
+            + self.positional_embedding[offset : offset + x.shape[-1]].to(dtype)
+        ).to(xa.dtype)
 
         for block in self.blocks:
             x = block(x, xa, mask=self.mask, kv_cache=kv_cache)
 
+        if isinstance(kv_cache, KVCache):
+            kv_cache.length += x.shape[1]
+
         x = self.ln(x)
+        if self.logits_projection is not None:
+            return self.logits_projection(x)
         logits = (
             x @ torch.transpose(self.token_embedding.weight.to(x.dtype), 0, 1)
         ).float()
@@ -269,11 +469,82 @@ class Whisper(nn.Module):
         )
         # use the last half among the decoder layers for time alignment by default;
         # to use a specific set of heads, see `set_alignment_heads()` below.
-        all_heads = torch.zeros(
-            self.dims.n_text_layer, self.dims.n_text_head, dtype=torch.bool
+        self.register_buffer(
+            "alignment_heads", default_alignment_heads(dims), persistent=False
         )
-        all_heads[self.dims.n_text_layer // 2 :] = True
-        self.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+        # set by `load_model` for the official checkpoints, to identify the model in caches
+        self.checkpoint_sha256: Optional[str] = None
+        # see `whisper.cache.EncoderCache`
+        self.encoder_cache: Optional[EncoderCache] = None
+        # set by `set_compute_dtype`
+        self.compute_dtype: Optional[torch.dtype] = None
+        # set by `quantize`
+        self.quantization: Optional[str] = None
+
+    @classmethod
+    def from_state_dict(cls, dims: ModelDimensions, state_dict: dict) -> "Whisper":
+        """
+        Build a model whose weights are the tensors of the state dict, without allocating and
+        initializing weights of its own, e.g. from a checkpoint memory-mapped by `torch.load`;
+        the weights keep the dtype of the state dict
+        """
+        with torch.device("meta"):
+            model = cls(dims)
+        model.load_state_dict(state_dict, assign=True)
+        # the mask is not saved in the state dict, so it is created again
+        model.decoder.register_buffer(
+            "mask", causal_mask(dims.n_text_ctx), persistent=False
+        )
+        return model
+
+    def fuse_qkv(self):
+        """Fuse the query, key and value projections of the self-attention layers"""
+        for block in [*self.encoder.blocks, *self.decoder.blocks]:
+            block.attn.fuse_qkv()
+        return self
+
+    def set_compute_dtype(self, dtype: torch.dtype):
+        """
+        Convert the weights to the dtype that `transcribe` and `decode` then compute in, once,
+        instead of casting them to the dtype of the inputs in every forward pass, e.g. to
+        torch.bfloat16; the LayerNorm weights are kept in float32, which it computes in.
+        The compute dtype takes precedence over the `fp16` option of `transcribe` and `decode`.
+        """
+        if self.quantization is not None and dtype != torch.float32:
+            raise ValueError("a quantized model computes in float32")
+        self.to(dtype)
+        for module in self.modules():
+            if isinstance(module, LayerNorm):
+                module.float()
+        self.compute_dtype = dtype
+        return self
+
+    def quantize(self):
+        """
+        Replace the linear layers of the encoder and decoder, and the projection of the decoder
+        outputs on the token embeddings, by dynamically quantized int8 layers for inference on
+        the CPU (see `quantize_linear`); the model then computes in float32
+        """
+        if self.device.type != "cpu":
+            raise ValueError("dynamic quantization is only supported on the CPU")
+        if self.compute_dtype not in (None, torch.float32):
+            raise ValueError("a quantized model computes in float32")
+        attention = [
+            block.attn for block in [*self.encoder.blocks, *self.decoder.blocks]
+        ]
+        if any(attn.qkv_weight is not None for attn in attention):
+            raise ValueError(
+                "the fused query, key and value weights cannot be quantized"
+            )
+
+        for module in list(self.modules()):
+            for name, child in list(module.named_children()):
+                if isinstance(child, Linear):
+                    setattr(module, name, quantize_linear(child.weight, child.bias))
+        embedding = self.decoder.token_embedding.weight
+        self.decoder.logits_projection = quantize_linear(embedding, None)
+        self.quantization = "int8"
+        return self
 
     def set_alignment_heads(self, dump: bytes):
         array = np.frombuffer(
@@ -285,6 +556,8 @@ class Whisper(nn.Module):
         self.register_buffer("alignment_heads", mask.to_sparse(), persistent=False)
 
     def embed_audio(self, mel: torch.Tensor):
+        if self.encoder_cache is not None:
+            return self.encoder_cache.embed_audio(self, mel)
         return self.encoder(mel)
 
     def logits(self, tokens: torch.Tensor, audio_features: torch.Tensor):
@@ -1,10 +1,13 @@
 import base64
+import json
 import os
 import string
+import struct
 from dataclasses import dataclass, field
 from functools import cached_property, lru_cache
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 import tiktoken
 
 LANGUAGES = {
@@ -140,9 +143,10 @@ class Tokenizer:
     special_tokens: Dict[str, int] = field(default_factory=dict)
 
     def __post_init__(self):
-        for special in self.encoding.special_tokens_set:
-            special_token = self.encoding.encode_single_token(special)
-            self.special_tokens[special] = special_token
+        if not self.special_tokens:
+            for special in self.encoding.special_tokens_set:
+                special_token = self.encoding.encode_single_token(special)
+                self.special_tokens[special] = special_token
 
         sot: int = self.special_tokens["<|startoftranscript|>"]
         translate: int = self.special_tokens["<|translate|>"]
@@ -159,6 +163,10 @@ class Tokenizer:
         self.sot_sequence = tuple(sot_sequence)
 
     def encode(self, text, **kwargs):
+        if "<|" not in text and "disallowed_special" not in kwargs:
+            # no special token can be found, so skip building the regex of all of them,
+            # which takes a fraction of a second the first time
+            kwargs["disallowed_special"] = ()
         return self.encoding.encode(text, **kwargs)
 
     def decode(self, token_ids: List[int], **kwargs) -> str:
@@ -250,6 +258,12 @@ class Tokenizer:
 
         keeping basic punctuations like commas, periods, question marks, exclamation points, etc.
         """
+        name = os.path.splitext(self.encoding.name)[0]
+        if (compiled := load_compiled_encoding(name)) is not None:
+            return compiled.non_speech_tokens
+        return self._find_non_speech_tokens()
+
+    def _find_non_speech_tokens(self) -> Tuple[int]:
         symbols = list('"#()*+/:;<=>@[\\]^_`{|}~「」『』')
         symbols += (
             "<< >> <<< >>> -- --- -( -[ (' (\" (( )) ((( ))) [[ ]] {{ }} ♪♪ ♪♪♪".split()
@@ -327,16 +341,22 @@ class Tokenizer:
         return words, word_tokens
 
 
-@lru_cache(maxsize=None)
-def get_encoding(name: str = "gpt2", num_languages: int = 99):
-    vocab_path = os.path.join(os.path.dirname(__file__), "assets", f"{name}.tiktoken")
-    ranks = {
-        base64.b64decode(token): int(rank)
-        for token, rank in (line.split() for line in open(vocab_path) if line)
-    }
-    n_vocab = len(ranks)
-    special_tokens = {}
+PAT_STR = (
+    r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+)
+
+COMPILED_MAGIC = b"WHSPTOK1"
+
+
+class CompiledEncoding(NamedTuple):
+    """The contents of a `<name>.tokenizer` asset, written by `compile_encoding`"""
+
+    ranks: Dict[bytes, int]
+    non_speech_tokens: Tuple[int]
 
+
+def get_special_tokens(n_vocab: int, num_languages: int) -> Dict[str, int]:
+    """The special tokens following the `n_vocab` mergeable tokens, with their ids"""
     specials = [
         "<|endoftext|>",
         "<|startoftranscript|>",
@@ -349,20 +369,102 @@ def get_encoding(name: str = "gpt2", num_languages: int = 99):
         "<|notimestamps|>",
         *[f"<|{i * 0.02:.2f}|>" for i in range(1501)],
     ]
+    return {token: n_vocab + i for i, token in enumerate(specials)}
+
+
+def _asset_path(name: str, extension: str) -> str:
+    return os.path.join(os.path.dirname(__file__), "assets", f"{name}.{extension}")
 
-    for token in specials:
-        special_tokens[token] = n_vocab
-        n_vocab += 1
 
+def _read_tiktoken(name: str) -> Dict[bytes, int]:
+    with open(_asset_path(name, "tiktoken")) as f:
+        return {
+            base64.b64decode(token): int(rank)
+            for token, rank in (line.split() for line in f if line)
+        }
+
+
+@lru_cache(maxsize=None)
+def load_compiled_encoding(name: str) -> Optional[CompiledEncoding]:
+    """
+    Read the `<name>.tokenizer` asset with a single read, or return None if there is none;
+    it holds the mergeable tokens in the order of their ranks and the non-speech tokens,
+    which are otherwise parsed from the `.tiktoken` file and found by encoding symbols
+    """
+    try:
+        with open(_asset_path(name, "tokenizer"), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if not data.startswith(COMPILED_MAGIC):
+        return None
+
+    offset = len(COMPILED_MAGIC)
+    (header_size,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    header = json.loads(data[offset : offset + header_size])
+    offset += header_size
+    n_tokens = header["n_tokens"]
+    lengths = np.frombuffer(data, "<u4", n_tokens, offset).astype(np.int64)
+    ends = offset + 4 * n_tokens + lengths.cumsum()
+    starts = ends - lengths
+    tokens = [data[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+    return CompiledEncoding(
+        ranks=dict(zip(tokens, range(n_tokens))),
+        non_speech_tokens=tuple(header["non_speech_tokens"]),
+    )
+
+
+def compile_encoding(name: str, path: Optional[str] = None) -> str:
+    """
+    Write the `<name>.tokenizer` asset from `<name>.tiktoken`, for `load_compiled_encoding`;
+    run `python -m whisper.tokenizer` to compile the assets again after changing the vocabularies
+    """
+    ranks = _read_tiktoken(name)
+    tokens = sorted(ranks, key=ranks.get)
+    assert [ranks[token] for token in tokens] == list(range(len(tokens)))
+
+    encoding = _make_encoding(name, ranks, num_languages=len(LANGUAGES))
+    tokenizer = Tokenizer(encoding=encoding, num_languages=len(LANGUAGES))
+    header = dict(
+        n_tokens=len(tokens),
+        non_speech_tokens=list(tokenizer._find_non_speech_tokens()),
+    )
+    header = json.dumps(header).encode()
+    lengths = np.array([len(token) for token in tokens], dtype="<u4")
+
+    path = path or _asset_path(name, "tokenizer")
+    with open(path, "wb") as f:
+        f.write(COMPILED_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(lengths.tobytes())
+        f.write(b"".join(tokens))
+    return path
+
+
+def _make_encoding(
+    name: str, ranks: Dict[bytes, int], num_languages: int
+) -> tiktoken.Encoding:
+    special_tokens = get_special_tokens(len(ranks), num_languages)
     return tiktoken.Encoding(
-        name=os.path.basename(vocab_path),
-        explicit_n_vocab=n_vocab,
-        pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+        name=f"{name}.tiktoken",
+        explicit_n_vocab=len(ranks) + len(special_tokens),
+        pat_str=PAT_STR,
         mergeable_ranks=ranks,
         special_tokens=special_tokens,
     )
 
 
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "gpt2", num_languages: int = 99):
+    if (compiled := load_compiled_encoding(name)) is not None:
+        ranks = compiled.ranks
+    else:
+        ranks = _read_tiktoken(name)
+    return _make_encoding(name, ranks, num_languages)
+
+
 @lru_cache(maxsize=None)
 def get_tokenizer(
     multilingual: bool,
@@ -389,7 +491,18 @@ def get_tokenizer(
         task = None
 
     encoding = get_encoding(name=encoding_name, num_languages=num_languages)
+    # the special tokens start with <|endoftext|>, after the mergeable tokens
+    special_tokens = get_special_tokens(encoding.eot_token, num_languages)
 
     return Tokenizer(
-        encoding=encoding, num_languages=num_languages, language=language, task=task
+        encoding=encoding,
+        num_languages=num_languages,
+        language=language,
+        task=task,
+        special_tokens=special_tokens,
     )
+
+
+if __name__ == "__main__":
+    for name in ["gpt2", "multilingual"]:
+        print(f"Wrote {compile_encoding(name)}")
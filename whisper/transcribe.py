@@ -1,8 +1,9 @@
 import argparse
+import json
 import os
 import traceback
 import warnings
-from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Generator, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -14,11 +15,23 @@ from .audio import (
     N_FRAMES,
     N_SAMPLES,
     SAMPLE_RATE,
+    AudioFile,
+    LazyLogMelSpectrogram,
+    load_audio,
     log_mel_spectrogram,
     pad_or_trim,
+    set_mel_cache,
+    set_pcm_cache,
 )
+from .cache import DiskCache, EncoderCache, TranscriptCache, default_cache_dir
 from .decoding import DecodingOptions, DecodingResult
-from .timing import add_word_timestamps
+from .incremental import (
+    audio_fingerprints,
+    load_waveform,
+    match_fingerprints,
+    pcm16,
+    reusable_segments,
+)
 from .tokenizer import LANGUAGES, TO_LANGUAGE_CODE, get_tokenizer
 from .utils import (
     exact_div,
@@ -37,7 +50,13 @@ if TYPE_CHECKING:
 
 def transcribe(
     model: "Whisper",
-    audio: Union[str, np.ndarray, torch.Tensor],
+    audio: Union[
+        AudioFile,
+        np.ndarray,
+        torch.Tensor,
+        Iterable[np.ndarray],
+        Tuple[np.ndarray, int],
+    ],
     *,
     verbose: Optional[bool] = None,
     temperature: Union[float, Tuple[float, ...]] = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
@@ -51,6 +70,11 @@ def transcribe(
     append_punctuations: str = "\"'.。,，!！?？:：”)]}、",
     clip_timestamps: Union[str, List[float]] = "0",
     hallucination_silence_threshold: Optional[float] = None,
+    lazy_mel: bool = False,
+    channels: int = 1,
+    transcript_cache: Optional[TranscriptCache] = None,
+    fingerprints: bool = False,
+    previous_result: Optional[dict] = None,
     **decode_options,
 ):
     """
@@ -61,8 +85,12 @@ def transcribe(
     model: Whisper
         The Whisper model instance
 
-    audio: Union[str, np.ndarray, torch.Tensor]
-        The path to the audio file to open, or the audio waveform
+    audio: Union[AudioFile, np.ndarray, torch.Tensor, Iterable[np.ndarray], Tuple[np.ndarray, int]]
+        The path to the audio file to open, or its contents as bytes or a binary file-like object
+        which are piped to ffmpeg, or the audio waveform (in float32, or int16 as returned
+        by `load_audio(..., dtype=np.int16)`, which is converted one window or block at a time),
+        or an iterable of consecutive waveform chunks such as the one from `whisper.audio.stream_audio`,
+        or a tuple of such a waveform or chunks and their sample rate, which are resampled to 16 kHz
 
     verbose: bool
         Whether to display the text being decoded to the console. If True, displays all the details,
@@ -107,31 +135,139 @@ def transcribe(
 
     clip_timestamps: Union[str, List[float]]
         Comma-separated list start,end,start,end,... timestamps (in seconds) of clips to process.
-        The last end timestamp defaults to the end of the file.
+        The last end timestamp defaults to the end of the file. When `audio` is a path, only the
+        clips are decoded from the file, seeking to each of them; the log-Mel spectrogram is then
+        normalized using the clips' maximum, and the language is detected from the first clip.
 
     hallucination_silence_threshold: Optional[float]
         When word_timestamps is True, skip silent periods longer than this threshold (in seconds)
         when a possible hallucination is detected
 
+    lazy_mel: bool
+        Compute the log-Mel spectrogram of each window when it is decoded, instead of computing it
+        for the whole audio upfront, so that memory use does not grow with the audio duration.
+        The result is identical; an audio file is decoded twice, as the first pass finds the global
+        maximum used for normalization (see `whisper.audio.LazyLogMelSpectrogram`), while waveform
+        chunks are concatenated in memory first, as they can only be read once. Otherwise, a
+        spectrogram found in the cache set with `whisper.audio.set_mel_cache` is memory-mapped,
+        and its windows are read as they are decoded as well
+
+    channels: int
+        The number of channels to load from an audio file and transcribe separately, e.g. for
+        recordings with one speaker per channel; a waveform of shape (n_channels, n_samples) is
+        also transcribed channel by channel. The current windows of all channels are encoded as
+        one batch, and the language is detected from all channels together
+
+    transcript_cache: Optional[TranscriptCache]
+        A cache of results keyed by the audio contents, the model checkpoint and all of the
+        options above that affect the result, from which the result is returned right away
+        when the same audio is transcribed again in the same way. The audio is hashed first,
+        which requires reading an audio file once more; streamed audio is never cached
+
+    fingerprints: bool
+        Whether to include the fingerprints of the audio in the result, as "fingerprints", so that
+        it can be passed as `previous_result` when transcribing an edited version of the audio
+
+    previous_result: Optional[dict]
+        The result of transcribing an earlier version of the audio with `fingerprints=True`, e.g.
+        before it was trimmed or spliced. The windows of that transcription whose audio, and that
+        of their neighbouring windows, is unchanged are reused with their timestamps shifted to
+        the new timeline, and only the rest of the audio is decoded again, as clips. The result
+        has the fingerprints of the new audio. The audio is loaded in memory, and must be mono
+
     Returns
     -------
     A dictionary containing the resulting text ("text") and segment-level details ("segments"), and
     the spoken language ("language"), which is detected when `decode_options["language"]` is None.
+    For multi-channel audio, a list of such dictionaries, one per channel, whose timestamps all
+    refer to the same timeline.
     """
+    options = {
+        k: v
+        for k, v in locals().items()
+        if k not in ("model", "audio", "verbose", "lazy_mel", "transcript_cache")
+    }
+
     dtype = torch.float16 if decode_options.get("fp16", True) else torch.float32
-    if model.device == torch.device("cpu"):
+    if isinstance(audio, os.PathLike):
+        audio = os.fspath(audio)
+    if model.compute_dtype is not None:
+        dtype = model.compute_dtype  # see `Whisper.set_compute_dtype`
+    elif model.device == torch.device("cpu"):
         if torch.cuda.is_available():
             warnings.warn("Performing inference on CPU when CUDA is available")
         if dtype == torch.float16:
             warnings.warn("FP16 is not supported on CPU; using FP32 instead")
             dtype = torch.float32
 
-    if dtype == torch.float32:
+    if dtype != torch.float16:
         decode_options["fp16"] = False
 
+    cache_key = None
+    if transcript_cache is not None:
+        cache_key = TranscriptCache.transcript_key(model, audio, options)
+        if cache_key is not None:
+            if (result := transcript_cache.get(cache_key)) is not None:
+                return result
+
+    reused_segments = None
+    chunk_fingerprints = None
+    if fingerprints or previous_result is not None:
+        if channels > 1:
+            raise ValueError("Fingerprints are only supported for mono audio")
+        audio = load_waveform(audio)
+        chunk_fingerprints = audio_fingerprints(pcm16(audio))
+        if previous_result is not None:
+            if clip_timestamps not in ("0", [0]):
+                raise ValueError("clip_timestamps cannot be used with previous_result")
+            regions = match_fingerprints(
+                previous_result["fingerprints"], chunk_fingerprints
+            )
+            reused_segments, clip_timestamps = reusable_segments(
+                previous_result, regions, audio.shape[-1] / SAMPLE_RATE
+            )
+            if decode_options.get("language", None) is None:
+                decode_options["language"] = previous_result["language"]
+
+    if isinstance(clip_timestamps, str):
+        clip_timestamps = [
+            float(ts) for ts in (clip_timestamps.split(",") if clip_timestamps else [])
+        ]
+    seek_points: List[int] = [round(ts * FRAMES_PER_SECOND) for ts in clip_timestamps]
+    if len(seek_points) == 0 and reused_segments is None:
+        seek_points.append(0)
+
+    if channels > 1 and not (isinstance(audio, np.ndarray) or torch.is_tensor(audio)):
+        audio = load_audio(audio, dtype=np.int16, channels=channels)
+    multichannel = (isinstance(audio, np.ndarray) or torch.is_tensor(audio)) and (
+        audio.ndim == 2
+    )
+    waveforms = list(audio) if multichannel else [audio]
+
+    # only decode the clips from an audio file, seeking to each of them
+    decode_clips = isinstance(audio, str) and seek_points != [0]
+
     # Pad 30-seconds of silence to the input audio, for slicing
-    mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
-    content_frames = mel.shape[-1] - N_FRAMES
+    if lazy_mel or decode_clips:
+        clips = None
+        if decode_clips:
+            ends = seek_points[1::2] + [None] * (len(seek_points) % 2)
+            clips = list(zip(seek_points[::2], ends))
+        mels = [
+            LazyLogMelSpectrogram(
+                waveform, model.dims.n_mels, padding=N_SAMPLES, clips=clips
+            )
+            for waveform in waveforms
+        ]
+    else:
+        mels = [
+            log_mel_spectrogram(waveform, model.dims.n_mels, padding=N_SAMPLES)
+            for waveform in waveforms
+        ]
+    content_frames = mels[0].shape[-1] - N_FRAMES
+    if len(seek_points) % 2 == 1:
+        seek_points.append(content_frames)
+    seek_clips: List[Tuple[int, int]] = list(zip(seek_points[::2], seek_points[1::2]))
     content_duration = float(content_frames * HOP_LENGTH / SAMPLE_RATE)
 
     if decode_options.get("language", None) is None:
@@ -142,9 +278,18 @@ def transcribe(
                 print(
                     "Detecting language using up to the first 30 seconds. Use `--language` to specify the language"
                 )
-            mel_segment = pad_or_trim(mel, N_FRAMES).to(model.device).to(dtype)
-            _, probs = model.detect_language(mel_segment)
-            decode_options["language"] = max(probs, key=probs.get)
+            start, end = seek_clips[0] if decode_clips else (0, N_FRAMES)
+            mel_segment = torch.stack(
+                [
+                    pad_or_trim(mel[:, start : min(end, start + N_FRAMES)], N_FRAMES)
+                    for mel in mels
+                ]
+            )
+            _, probs = model.detect_language(mel_segment.to(model.device).to(dtype))
+            # the language with the highest probability summed over the channels
+            decode_options["language"] = max(
+                probs[0], key=lambda lang: sum(p[lang] for p in probs)
+            )
             if verbose is not None:
                 print(
                     f"Detected language: {LANGUAGES[decode_options['language']].title()}"
@@ -159,19 +304,11 @@ def transcribe(
         task=task,
     )
 
-    if isinstance(clip_timestamps, str):
-        clip_timestamps = [
-            float(ts) for ts in (clip_timestamps.split(",") if clip_timestamps else [])
-        ]
-    seek_points: List[int] = [round(ts * FRAMES_PER_SECOND) for ts in clip_timestamps]
-    if len(seek_points) == 0:
-        seek_points.append(0)
-    if len(seek_points) % 2 == 1:
-        seek_points.append(content_frames)
-    seek_clips: List[Tuple[int, int]] = list(zip(seek_points[::2], seek_points[1::2]))
-
     punctuation = "\"'“¿([{-\"'.。,，!！?？:：”)]}、"
 
+    if word_timestamps:
+        from .timing import add_word_timestamps  # imports numba
+
     if word_timestamps and task == "translate":
         warnings.warn("Word-level timestamps on translations may not be reliable.")
 
@@ -215,45 +352,51 @@ def transcribe(
 
         return decode_result
 
-    clip_idx = 0
-    seek = seek_clips[clip_idx][0]
     input_stride = exact_div(
         N_FRAMES, model.dims.n_audio_ctx
     )  # mel frames per output token: 2
     time_precision = (
         input_stride * HOP_LENGTH / SAMPLE_RATE
     )  # time per output token: 0.02 (seconds)
-    all_tokens = []
-    all_segments = []
-    prompt_reset_since = 0
 
     if initial_prompt is not None:
         initial_prompt_tokens = tokenizer.encode(" " + initial_prompt.strip())
-        all_tokens.extend(initial_prompt_tokens)
     else:
         initial_prompt_tokens = []
 
-    def new_segment(
-        *, start: float, end: float, tokens: torch.Tensor, result: DecodingResult
-    ):
-        tokens = tokens.tolist()
-        text_tokens = [token for token in tokens if token < tokenizer.eot]
-        return {
-            "seek": seek,
-            "start": start,
-            "end": end,
-            "text": tokenizer.decode(text_tokens),
-            "tokens": tokens,
-            "temperature": result.temperature,
-            "avg_logprob": result.avg_logprob,
-            "compression_ratio": result.compression_ratio,
-            "no_speech_prob": result.no_speech_prob,
-        }
+    def transcribe_channel(
+        mel: Union[torch.Tensor, LazyLogMelSpectrogram], pbar: tqdm.tqdm, prefix: str
+    ) -> Generator[torch.Tensor, torch.Tensor, dict]:
+        # yields the Mel spectrogram of each window and receives its encoded audio features,
+        # so that the current windows of all channels are encoded as one batch
+        clip_idx = 0
+        seek = seek_clips[clip_idx][0] if seek_clips else 0
+        all_tokens = list(initial_prompt_tokens)
+        all_segments = []
+        prompt_reset_since = 0
+        # the reused segments before each clip become part of the prompt of its first window
+        reused_tokens = [
+            (round(segment["end"] * FRAMES_PER_SECOND), segment["tokens"])
+            for segment in reused_segments or []
+        ]
+
+        def new_segment(
+            *, start: float, end: float, tokens: torch.Tensor, result: DecodingResult
+        ):
+            tokens = tokens.tolist()
+            text_tokens = [token for token in tokens if token < tokenizer.eot]
+            return {
+                "seek": seek,
+                "start": start,
+                "end": end,
+                "text": tokenizer.decode(text_tokens),
+                "tokens": tokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }
 
-    # show the progress bar when verbose is False (if True, transcribed text will be printed)
-    with tqdm.tqdm(
-        total=content_frames, unit="frames", disable=verbose is not False
-    ) as pbar:
         last_speech_timestamp = 0.0
         # NOTE: This loop is obscurely flattened to make the diff readable.
         # A later commit should turn this into a simpler nested loop.
@@ -268,6 +411,8 @@ def transcribe(
                 if clip_idx < len(seek_clips):
                     seek = seek_clips[clip_idx][0]
                 continue
+            while reused_tokens and reused_tokens[0][0] <= seek:
+                all_tokens.extend(reused_tokens.pop(0)[1])
             time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
             window_end_time = float((seek + N_FRAMES) * HOP_LENGTH / SAMPLE_RATE)
             segment_size = min(N_FRAMES, content_frames - seek, seek_clip_end - seek)
@@ -275,8 +420,9 @@ def transcribe(
             segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
             mel_segment = pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
 
+            audio_features = yield mel_segment
             decode_options["prompt"] = all_tokens[prompt_reset_since:]
-            result: DecodingResult = decode_with_fallback(mel_segment)
+            result: DecodingResult = decode_with_fallback(audio_features)
             tokens = torch.tensor(result.tokens)
 
             if no_speech_threshold is not None:
@@ -463,7 +609,7 @@ def transcribe(
                 for segment in current_segments:
                     start, end, text = segment["start"], segment["end"], segment["text"]
                     line = f"[{format_timestamp(start)} --> {format_timestamp(end)}] {text}"
-                    print(make_safe(line))
+                    print(make_safe(prefix + line))
 
             # if a segment is instantaneous or does not contain text, clear it
             for i, segment in enumerate(current_segments):
@@ -491,11 +637,54 @@ def transcribe(
             # update progress bar
             pbar.update(min(content_frames, seek) - previous_seek)
 
-    return dict(
-        text=tokenizer.decode(all_tokens[len(initial_prompt_tokens) :]),
-        segments=all_segments,
-        language=language,
-    )
+        return dict(
+            text=tokenizer.decode(all_tokens[len(initial_prompt_tokens) :]),
+            segments=all_segments,
+            language=language,
+        )
+
+    # show the progress bar when verbose is False (if True, transcribed text will be printed)
+    with tqdm.tqdm(
+        total=content_frames * len(mels), unit="frames", disable=verbose is not False
+    ) as pbar:
+        tasks = [
+            transcribe_channel(mel, pbar, f"[channel {i}] " if multichannel else "")
+            for i, mel in enumerate(mels)
+        ]
+        results: List[Optional[dict]] = [None] * len(tasks)
+        audio_features: List[Optional[torch.Tensor]] = [None] * len(tasks)
+        while True:
+            mel_segments = {}
+            for i, task in enumerate(tasks):
+                if results[i] is None:
+                    try:
+                        mel_segments[i] = task.send(audio_features[i])
+                    except StopIteration as stop:
+                        results[i] = stop.value
+            if not mel_segments:
+                break
+
+            with torch.no_grad():
+                batch = model.embed_audio(torch.stack(list(mel_segments.values())))
+            for i, features in zip(mel_segments, batch):
+                audio_features[i] = features
+
+    result = results if multichannel else results[0]
+    if reused_segments is not None:
+        segments = sorted(
+            reused_segments + result["segments"], key=lambda s: s["start"]
+        )
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+        tokens = [token for segment in segments for token in segment["tokens"]]
+        result = dict(
+            text=tokenizer.decode(tokens), segments=segments, language=language
+        )
+    if chunk_fingerprints is not None:
+        result["fingerprints"] = chunk_fingerprints
+    if cache_key is not None:
+        transcript_cache.put(cache_key, result)
+    return result
 
 
 def cli():
@@ -514,6 +703,9 @@ def cli():
     parser.add_argument("--model", default="turbo", type=valid_model_name, help="name of the Whisper model to use")
     parser.add_argument("--model_dir", type=str, default=None, help="the path to save model files; uses ~/.cache/whisper by default")
     parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu", help="device to use for PyTorch inference")
+    parser.add_argument("--compute_dtype", type=str, default=None, choices=["float32", "float16", "bfloat16"], help="convert the model weights to this dtype once and compute in it, keeping LayerNorm in float32; overrides --fp16")
+    parser.add_argument("--quantize", type=str, default=None, choices=["int8"], help="quantize the linear layers dynamically to int8 for faster inference on the CPU")
+    parser.add_argument("--fuse_qkv", type=str2bool, default=False, help="compute the query, key and value projections of self-attention with a single fused matrix multiplication")
     parser.add_argument("--output_dir", "-o", type=str, default=".", help="directory to save the outputs")
     parser.add_argument("--output_format", "-f", type=str, default="all", choices=["txt", "vtt", "srt", "tsv", "json", "all"], help="format of the output file; if not specified, all available formats will be produced")
     parser.add_argument("--verbose", type=str2bool, default=True, help="whether to print out the progress and debug messages")
@@ -546,6 +738,19 @@ def cli():
     parser.add_argument("--threads", type=optional_int, default=0, help="number of threads used by torch for CPU inference; supercedes MKL_NUM_THREADS/OMP_NUM_THREADS")
     parser.add_argument("--clip_timestamps", type=str, default="0", help="comma-separated list start,end,start,end,... timestamps (in seconds) of clips to process, where the last end timestamp defaults to the end of the file")
     parser.add_argument("--hallucination_silence_threshold", type=optional_float, help="(requires --word_timestamps True) skip silent periods longer than this threshold (in seconds) when a possible hallucination is detected")
+    parser.add_argument("--channels", type=int, default=1, help="number of audio channels to transcribe separately, e.g. one per speaker; the outputs of each channel are written with a _channel<N> suffix")
+    parser.add_argument("--cache_dir", type=str, default=None, help="the directory for the on-disk caches; uses ~/.cache/whisper by default")
+    parser.add_argument("--pcm_cache", type=str2bool, default=False, help="keep the audio decoded by ffmpeg in a cache, to be reused when transcribing the same files again")
+    parser.add_argument("--pcm_cache_size", type=float, default=10.0, help="the maximum size of the decoded audio cache in GB, beyond which the least recently used files are evicted")
+    parser.add_argument("--mel_cache", type=str2bool, default=False, help="keep the log-Mel spectrograms in a cache, keyed by the audio content, to be reused when transcribing the same audio again")
+    parser.add_argument("--mel_cache_size", type=float, default=10.0, help="the maximum size of the log-Mel spectrogram cache in GB, beyond which the least recently used entries are evicted")
+    parser.add_argument("--encoder_cache", type=str2bool, default=False, help="keep the audio encoder outputs in memory, keyed by the content of each 30-second window, to skip encoding identical windows again")
+    parser.add_argument("--encoder_cache_size", type=float, default=1.0, help="the maximum size of the in-memory encoder output cache in GB")
+    parser.add_argument("--encoder_disk_cache_size", type=optional_float, default=None, help="if given, also keep the encoder outputs on disk, up to this size in GB")
+    parser.add_argument("--transcript_cache", type=str2bool, default=False, help="keep the transcription results in a cache, keyed by the audio content, the model and the options, to return them right away when transcribing the same audio again")
+    parser.add_argument("--transcript_cache_size", type=float, default=1.0, help="the maximum size of the transcription result cache in GB, beyond which the least recently used results are evicted")
+    parser.add_argument("--incremental", type=str2bool, default=False, help="record fingerprints of the audio in the JSON output, and if it is there from an earlier run on a since trimmed or spliced version of the file, only transcribe the changed parts again")
+    parser.add_argument("--lazy_mel", type=str2bool, default=False, help="compute the log-Mel spectrogram window by window to keep memory use constant for long audio; audio files are decoded twice")
     # fmt: on
 
     args = parser.parse_args().__dict__
@@ -554,6 +759,19 @@ def cli():
     output_dir: str = args.pop("output_dir")
     output_format: str = args.pop("output_format")
     device: str = args.pop("device")
+    fuse_qkv: bool = args.pop("fuse_qkv")
+    quantize: Optional[str] = args.pop("quantize")
+    compute_dtype: Optional[str] = args.pop("compute_dtype")
+    if quantize is not None:
+        # checked before loading the model, which would fail only after reading the checkpoint
+        if fuse_qkv:
+            parser.error("--quantize cannot be combined with --fuse_qkv True")
+        if compute_dtype not in (None, "float32"):
+            parser.error(
+                f"--quantize cannot be combined with --compute_dtype {compute_dtype}"
+            )
+        if torch.device(device).type != "cpu":
+            parser.error("--quantize is only supported with --device cpu")
     os.makedirs(output_dir, exist_ok=True)
 
     if model_name.endswith(".en") and args["language"] not in {"en", "English"}:
@@ -572,9 +790,39 @@ def cli():
     if (threads := args.pop("threads")) > 0:
         torch.set_num_threads(threads)
 
+    cache_dir: str = args.pop("cache_dir") or default_cache_dir()
+    pcm_cache_size = int(args.pop("pcm_cache_size") * 1e9)
+    if args.pop("pcm_cache"):
+        set_pcm_cache(DiskCache(os.path.join(cache_dir, "pcm"), pcm_cache_size))
+    mel_cache_size = int(args.pop("mel_cache_size") * 1e9)
+    if args.pop("mel_cache"):
+        set_mel_cache(DiskCache(os.path.join(cache_dir, "mel"), mel_cache_size))
+    transcript_cache_size = int(args.pop("transcript_cache_size") * 1e9)
+    if args.pop("transcript_cache"):
+        transcript_dir = os.path.join(cache_dir, "transcripts")
+        args["transcript_cache"] = TranscriptCache(
+            transcript_dir, transcript_cache_size
+        )
+
     from . import load_model
 
-    model = load_model(model_name, device=device, download_root=model_dir)
+    model = load_model(
+        model_name,
+        device=device,
+        download_root=model_dir,
+        fuse_qkv=fuse_qkv,
+        quantize=quantize,
+    )
+    if compute_dtype is not None:
+        model.set_compute_dtype(getattr(torch, compute_dtype))
+    encoder_cache_size = int(args.pop("encoder_cache_size") * 1e9)
+    encoder_disk_cache_size = args.pop("encoder_disk_cache_size")
+    if args.pop("encoder_cache"):
+        disk = None
+        if encoder_disk_cache_size is not None:
+            encoder_dir = os.path.join(cache_dir, "encoder")
+            disk = DiskCache(encoder_dir, int(encoder_disk_cache_size * 1e9))
+        model.encoder_cache = EncoderCache(encoder_cache_size, disk)
 
     writer = get_writer(output_format, output_dir)
     word_options = [
@@ -592,10 +840,30 @@ def cli():
     if args["max_words_per_line"] and args["max_line_width"]:
         warnings.warn("--max_words_per_line has no effect with --max_line_width")
     writer_args = {arg: args.pop(arg) for arg in word_options}
+    if (incremental := args.pop("incremental")) and output_format not in (
+        "json",
+        "all",
+    ):
+        parser.error("--incremental requires the json output format")
     for audio_path in args.pop("audio"):
         try:
+            if incremental:
+                args["fingerprints"] = True
+                args["previous_result"] = None
+                audio_basename = os.path.splitext(os.path.basename(audio_path))[0]
+                json_path = os.path.join(output_dir, audio_basename + ".json")
+                if os.path.exists(json_path):
+                    with open(json_path, encoding="utf-8") as f:
+                        previous_result = json.load(f)
+                    if "fingerprints" in previous_result:
+                        args["previous_result"] = previous_result
             result = transcribe(model, audio_path, temperature=temperature, **args)
-            writer(result, audio_path, **writer_args)
+            if isinstance(result, list):
+                root, ext = os.path.splitext(audio_path)
+                for i, channel_result in enumerate(result):
+                    writer(channel_result, f"{root}_channel{i}{ext}", **writer_args)
+            else:
+                writer(result, audio_path, **writer_args)
         except Exception as e:
             traceback.print_exc()
             print(f"Skipping {audio_path} due to {type(e).__name__}: {str(e)}")